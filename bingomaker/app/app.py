@@ -1,13 +1,39 @@
+import json
 import random
+from collections.abc import Iterable
+from itertools import chain
 
-from flask import Flask, current_app, render_template, request
+from flask import Flask, Response, current_app, render_template, request
 
 from bingomaker.data.persistence import TilePoolDB, tile_to_dict
-from bingomaker.game.game import Board
+from bingomaker.data.serialization import board_to_bytes, board_to_compact, stream_end
+from bingomaker.game.cardid import MAX_SIZE, card_id, decode_card_id
+from bingomaker.game.cardset import generate_card_set
+from bingomaker.game.game import Board, NoMatchingTile, TilePool, generate_boards
+from bingomaker.game.rng import MASK64
 
 from . import image_routes, tilepool_routes
 from .config import Config, LocalDiskConfig
 
+MAX_BATCH_CARDS = 100_000
+CARD_FORMATS = ("full", "compact", "binary")
+
+
+def board_to_card(pool: TilePool, board: Board, compact: bool = False) -> dict:
+    if compact:
+        return {"id": board.id, "card_id": card_id(pool, board), **board_to_compact(pool, board)}
+    return {
+        "id": board.id,
+        "card_id": card_id(pool, board),
+        "size": board.size,
+        "tiles": [tile_to_dict(tile) for row in board.board for tile in row],
+    }
+
+
+def parse_tags(values: Iterable[str]) -> frozenset[str]:
+    """Parse tags from comma separated query parameter values"""
+    return frozenset(tag for value in values for tag in value.split(",") if tag)
+
 
 def create_app(config: type[Config] = LocalDiskConfig) -> Flask:
     app = Flask(__name__)
@@ -29,9 +55,19 @@ def create_app(config: type[Config] = LocalDiskConfig) -> Flask:
     def generate_card(tilepoolId: str):
         try:
             size = int(request.args.get("size", 5))
-            seed = int(request.args.get("seed", random.randint(0, 1 << 16)))
+            seed = int(request.args.get("seed", random.getrandbits(64)))
+            compat = request.args.get("compat", "false").lower() in ("true", "1", "t", "yes")
         except (ValueError, TypeError):
             return "Invalid input or request parameters", 400
+        excluded_tags = parse_tags(request.args.getlist("excluded_tags"))
+        format_ = request.args.get("format", "full")
+
+        if not 0 < size <= MAX_SIZE:
+            return f"size must be between 1 and {MAX_SIZE}", 400
+        if not 0 <= seed <= MASK64:
+            return f"seed must be between 0 and {MASK64}", 400
+        if format_ not in CARD_FORMATS:
+            return f"format must be one of {', '.join(CARD_FORMATS)}", 400
 
         db = current_app.config["DB"]
         if not isinstance(db, TilePoolDB):
@@ -42,13 +78,135 @@ def create_app(config: type[Config] = LocalDiskConfig) -> Flask:
 
         pool = result["tiles"]
 
-        # excluded_tags = request.args.get("excluded_tags")
-        board = Board(pool, size=size, free_square=pool.free is not None, seed=seed)
+        try:
+            board = Board(
+                pool,
+                size=size,
+                free_square=pool.free is not None,
+                seed=seed,
+                exclude_tags=excluded_tags,
+                compat=compat,
+            )
+        except NoMatchingTile as e:
+            return str(e), 400
         board.id = str(seed)
-        return {
-            "id": board.id,
-            "size": board.size,
-            "tiles": [tile_to_dict(tile) for row in board.board for tile in row],
-        }
+        if format_ == "binary":
+            return Response(board_to_bytes(pool, board), mimetype="application/octet-stream")
+        return board_to_card(pool, board, compact=format_ == "compact")
+
+    @app.route("/bingocard/<tilepoolId>/card/<cardId>")
+    def decode_card(tilepoolId: str, cardId: str):
+        db = current_app.config["DB"]
+        if not isinstance(db, TilePoolDB):
+            return "internal server error", 500
+
+        if (result := db.get_tile_pool(tilepoolId)) is None:
+            return "Tile pool not found", 404
+
+        pool = result["tiles"]
+        try:
+            board = decode_card_id(pool, cardId)
+        except (ValueError, NoMatchingTile):
+            return "Invalid card id for this tile pool", 404
+
+        return board_to_card(pool, board)
+
+    @app.post("/bingocard/<tilepoolId>/batch")
+    def generate_cards(tilepoolId: str):
+        if (data := request.json) is None:
+            return "Missing request data", 400
+
+        try:
+            count = int(data["count"])
+            size = int(data.get("size", 5))
+            seed = int(data.get("seed", random.getrandbits(64)))
+            compat = data.get("compat", False)
+            unique = data.get("unique", False)
+            if not isinstance(compat, bool) or not isinstance(unique, bool):
+                raise TypeError("compat and unique must be booleans")
+            max_overlap = data.get("max_overlap")
+            max_overlap = None if max_overlap is None else int(max_overlap)
+            excluded_tags = data.get("excluded_tags", [])
+            if not isinstance(excluded_tags, list) or not all(
+                isinstance(tag, str) for tag in excluded_tags
+            ):
+                raise TypeError("excluded_tags must be a list of strings")
+            format_ = data.get("format", "full")
+        except (KeyError, ValueError, TypeError):
+            return "Invalid input or request parameters", 400
+
+        if not 0 < count <= MAX_BATCH_CARDS:
+            return f"count must be between 1 and {MAX_BATCH_CARDS}", 400
+        if not 0 < size <= MAX_SIZE:
+            return f"size must be between 1 and {MAX_SIZE}", 400
+        if not 0 <= seed <= MASK64:
+            return f"seed must be between 0 and {MASK64}", 400
+        if format_ not in CARD_FORMATS:
+            return f"format must be one of {', '.join(CARD_FORMATS)}", 400
+        if max_overlap is not None and max_overlap < 0:
+            return "max_overlap must not be negative", 400
+        if compat and (unique or max_overlap is not None):
+            return "compat cannot be combined with unique or max_overlap", 400
+
+        db = current_app.config["DB"]
+        if not isinstance(db, TilePoolDB):
+            return "internal server error", 500
+
+        if (result := db.get_tile_pool(tilepoolId)) is None:
+            return "Tile pool not found", 404
+
+        pool = result["tiles"]
+        free_square = pool.free is not None
+        if unique or max_overlap is not None:
+            boards = generate_card_set(
+                pool,
+                count,
+                size=size,
+                free_square=free_square,
+                seed=seed,
+                max_overlap=max_overlap,
+                exclude_tags=excluded_tags,
+            )
+        else:
+            boards = generate_boards(
+                pool,
+                count,
+                size=size,
+                free_square=free_square,
+                seed=seed,
+                exclude_tags=excluded_tags,
+                compat=compat,
+            )
+
+        # generate the first card eagerly so errors are reported before streaming begins
+        try:
+            first = next(boards)
+        except ValueError as e:
+            return str(e), 400
+        except NoMatchingTile as e:
+            return str(e), 400
+
+        def stream():
+            try:
+                for board in chain((first,), boards):
+                    board.id = str(board.seed)
+                    yield json.dumps(board_to_card(pool, board, format_ == "compact")) + "\n"
+            except NoMatchingTile as e:
+                yield json.dumps({"error": str(e)}) + "\n"
+
+        def stream_binary():
+            # a failure mid batch ends the stream without its end record
+            count = 0
+            try:
+                for board in chain((first,), boards):
+                    yield board_to_bytes(pool, board)
+                    count += 1
+            except NoMatchingTile:
+                return
+            yield stream_end(count)
+
+        if format_ == "binary":
+            return Response(stream_binary(), mimetype="application/octet-stream")
+        return Response(stream(), mimetype="application/x-ndjson")
 
     return app
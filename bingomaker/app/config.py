@@ -1,6 +1,6 @@
 import os
 
-from bingomaker.data import DynamoTilePoolDB, FileTilePoolDB, MemoryTilePoolDB
+from bingomaker.data import DynamoTilePoolDB, FileTilePoolDB, MemoryTilePoolDB, SQLiteTilePoolDB
 from bingomaker.images import (
     LocalImageManager,
     LocalReferenceCounts,
@@ -56,6 +56,16 @@ class LocalDiskConfig(Config):
         return LocalImageManager("image_store", LocalReferenceCounts("counts"))
 
 
+class LocalSQLiteConfig(Config):
+    @property
+    def DB(self):
+        return SQLiteTilePoolDB("tiles.sqlite3")
+
+    @property
+    def IMAGES(self):
+        return LocalImageManager("image_store", LocalReferenceCounts("counts"))
+
+
 class LocalAWSConfig(Config):
     @property
     def DB(self):
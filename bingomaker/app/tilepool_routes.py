@@ -15,7 +15,22 @@ def get_tilepools():
     sort_asc = request.args.get(
         "sortAsc", True, type=lambda x: x.lower() in ("true", "1", "t", "yes")
     )
-    results = db.get_tile_pools(size, page, sort, sort_asc)
+    cursor = request.args.get("cursor")
+
+    # pages without a page number are followed with the cursor in X-Next-Cursor
+    headers = {}
+    if size is not None and page is None:
+        try:
+            page_result = db.get_tile_pools_page(size, cursor, sort, sort_asc)
+        except ValueError:
+            return "Invalid cursor", 400
+        results, next_cursor = page_result if page_result is not None else (None, None)
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+    elif cursor is not None:
+        return "cursor requires size and no page", 400
+    else:
+        results = db.get_tile_pools(size, page, sort, sort_asc)
     if results is None:
         return [], 200
 
@@ -26,13 +41,14 @@ def get_tilepools():
             "name": result["name"],
             "owner": result["owner"],
             "created_at": result["created_at"],
-            "tiles": [tile_to_dict(tile) for tile in result["tiles"].tiles],
+            "tiles": [tile_to_dict(tile) for tile in result["tiles"]],
+            "version": result["tiles"].version,
         }
         if (free := result["tiles"].free) is not None:
             item["free_tile"] = tile_to_dict(free)
         response.append(item)
 
-    return response, 200
+    return response, 200, headers
 
 
 @bp.post("/tilepools")
@@ -51,7 +67,7 @@ def new_tilepool():
             pool = TilePool(tiles, dict_to_tile(free))
         else:
             pool = TilePool(tiles)
-    except (ValueError, KeyError):
+    except (TypeError, ValueError, KeyError):
         return "Incorrect tile format", 400
 
     if (id_ := db.insert_tile_pool(name, "<SYSTEM OWNER>", pool)) is None:
@@ -75,7 +91,8 @@ def get_tilepool(tilepoolId):
         "name": result["name"],
         "owner": result["owner"],
         "created_at": result["created_at"],
-        "tiles": [tile_to_dict(tile) for tile in result["tiles"].tiles],
+        "tiles": [tile_to_dict(tile) for tile in result["tiles"]],
+        "version": result["tiles"].version,
     }
     if (free := result["tiles"].free) is not None:
         response["free_tile"] = tile_to_dict(free)
@@ -102,7 +119,7 @@ def update_tilepool(tilepoolId):
     if insertions:
         try:
             parsed_insertions = [dict_to_tile(tile) for tile in insertions]
-        except (TypeError, KeyError):
+        except (TypeError, ValueError, KeyError):
             return "Malformed tile insertions", 400
     else:
         parsed_insertions = None
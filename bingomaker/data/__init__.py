@@ -1,6 +1,16 @@
+from bingomaker.data.cache import CachingTilePoolDB
 from bingomaker.data.dynamodb import DynamoTilePoolDB
 from bingomaker.data.file import FileTilePoolDB, read_text
 from bingomaker.data.memory import MemoryTilePoolDB
 from bingomaker.data.serialization import BoardEncoder
+from bingomaker.data.sqlite import SQLiteTilePoolDB
 
-__all__ = ["BoardEncoder", "read_text", "FileTilePoolDB", "MemoryTilePoolDB", "DynamoTilePoolDB"]
+__all__ = [
+    "BoardEncoder",
+    "read_text",
+    "FileTilePoolDB",
+    "MemoryTilePoolDB",
+    "DynamoTilePoolDB",
+    "SQLiteTilePoolDB",
+    "CachingTilePoolDB",
+]
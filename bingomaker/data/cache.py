@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import TypedDict
+
+from bingomaker.data.persistence import DBResult, SortMethod, TilePoolDB
+from bingomaker.game.game import Tile
+
+
+class CacheStats(TypedDict):
+    hits: int
+    misses: int
+    evictions: int
+    """Pools dropped to make room for another pool"""
+    expirations: int
+    """Pools dropped because they were older than the time to live"""
+    size: int
+
+
+class CachingTilePoolDB(TilePoolDB):
+    """Wraps a TilePoolDB, keeping recently read pools in memory
+
+    Up to max_pools pools are kept, dropping the least recently used one first, and a pool
+    is read again once it has been cached for ttl seconds. Writes through the wrapper
+    invalidate the pools they change, but writes by other processes are only seen once the
+    cached pool expires. Listings are not cached.
+    """
+
+    def __init__(self, db: TilePoolDB, max_pools: int = 128, ttl: float | None = 30.0):
+        if max_pools < 1:
+            raise ValueError("max_pools must be positive")
+        self.db = db
+        self.max_pools = max_pools
+        self.ttl = ttl
+
+        self._pools: OrderedDict[str, tuple[float, DBResult]] = OrderedDict()
+        self._lock = threading.Lock()
+        # incremented by every write, so a pool read while a write was happening is not cached
+        self._writes = 0
+        self._hits = self._misses = self._evictions = self._expirations = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "size": len(self._pools),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._writes += 1
+            self._pools.clear()
+
+    def _invalidate(self, tile_pool_id: str):
+        with self._lock:
+            self._writes += 1
+            self._pools.pop(tile_pool_id, None)
+
+    def get_tile_pool(self, tile_pool_id: str) -> DBResult | None:
+        now = time.monotonic()
+        with self._lock:
+            if (entry := self._pools.get(tile_pool_id)) is not None:
+                cached_at, result = entry
+                if self.ttl is None or now - cached_at < self.ttl:
+                    self._pools.move_to_end(tile_pool_id)
+                    self._hits += 1
+                    return result
+                del self._pools[tile_pool_id]
+                self._expirations += 1
+            self._misses += 1
+            writes = self._writes
+
+        if (result := self.db.get_tile_pool(tile_pool_id)) is None:
+            return None
+
+        with self._lock:
+            if writes == self._writes:
+                self._pools[tile_pool_id] = (now, result)
+                self._pools.move_to_end(tile_pool_id)
+                while len(self._pools) > self.max_pools:
+                    self._pools.popitem(last=False)
+                    self._evictions += 1
+        return result
+
+    def insert_tile_pool(self, name: str, owner: str, pool) -> str | None:
+        return self.db.insert_tile_pool(name, owner, pool)
+
+    def delete_tile_pool(self, tile_pool_id: str) -> bool:
+        deleted = self.db.delete_tile_pool(tile_pool_id)
+        self._invalidate(tile_pool_id)
+        return deleted
+
+    def delete_tile_pool_by_owner(self, owner: str) -> bool:
+        deleted = self.db.delete_tile_pool_by_owner(owner)
+        with self._lock:
+            self._writes += 1
+            owned = [id_ for id_, (_, result) in self._pools.items() if result["owner"] == owner]
+            for id_ in owned:
+                del self._pools[id_]
+        return deleted
+
+    def update_tiles(
+        self,
+        tile_pool_id: str,
+        removals: list[str] | None = None,
+        insertions: list[Tile] | None = None,
+    ) -> bool:
+        updated = self.db.update_tiles(tile_pool_id, removals, insertions)
+        self._invalidate(tile_pool_id)
+        return updated
+
+    def get_tile_pools(
+        self,
+        size: int | None = None,
+        page: int | None = None,
+        sort: SortMethod = SortMethod.DEFAULT,
+        sort_asc: bool = True,
+    ) -> list[DBResult] | None:
+        return self.db.get_tile_pools(size, page, sort, sort_asc)
+
+    def get_tile_pools_page(
+        self,
+        size: int,
+        cursor: str | None = None,
+        sort: SortMethod = SortMethod.DEFAULT,
+        sort_asc: bool = True,
+    ) -> tuple[list[DBResult], str | None] | None:
+        return self.db.get_tile_pools_page(size, cursor, sort, sort_asc)
@@ -1,13 +1,167 @@
+import contextlib
 import datetime
+import functools
+import heapq
+import itertools
+import time
+import zlib
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 
 import boto3
-
-from bingomaker.data.persistence import DBResult, SortMethod, TilePoolDB, tile_to_dict
+from botocore.exceptions import ClientError
+
+from bingomaker.data.persistence import (
+    DBResult,
+    SortMethod,
+    TilePoolDB,
+    decode_cursor,
+    encode_cursor,
+)
 from bingomaker.game.game import Tile, TilePool
 
+LISTING = "pool"
+"""Prefix of the partition keys of pools in the listing indexes"""
+LISTING_SHARDS = 4
+"""Partitions pools are spread over in the listing indexes, each read by every listing"""
+
+LISTING_INDEXES = {
+    SortMethod.DEFAULT: "byCreatedAt",
+    SortMethod.AGE: "byCreatedAt",
+    SortMethod.NAME: "byName",
+    SortMethod.OWNER: "byOwner",
+}
+"""Global secondary index sorting pools by each sort method"""
+INDEX_SORT_KEYS = {"byCreatedAt": "createdAt", "byName": "nameKey", "byOwner": "owner"}
+
+NAME_KEY_BYTES = 512
+"""Bytes of a name kept in its sort key, which DynamoDB limits to 1024 bytes"""
+
+BATCH_GET_LIMIT = 25
+BATCH_WRITE_LIMIT = 25
+CHANGES_PER_UPDATE = 100
+UPDATE_ATTEMPTS = 3
+
+INLINE_TILE_BYTES = 256 * 1024
+"""Pools with more tile data than this are split into chunk items, and items counted as
+holding more than this are checked"""
+CHUNK_BYTES = 128 * 1024
+"""Average tile data of a chunk, leaving room to grow under the 400KB item limit"""
+SPLIT_BYTES = 3 * CHUNK_BYTES // 2
+"""Checked items holding more tile data than this split their pool into more chunks"""
+CHUNK_WORKERS = 8
+
+BATCH_ATTEMPTS = 8
+BACKOFF_SECONDS = 0.05
+"""Delay before retrying unprocessed batch requests, doubling with every attempt"""
+
+
+Layout = tuple[int, str]
+"""The number of chunks of a pool and the set they belong to, with no chunks for inline pools"""
+
+
+def _listing_shard(shard: int) -> str:
+    return f"{LISTING}#{shard}"
+
+
+def _listing(tile_pool_id: str) -> str:
+    """Return the partition of a pool in the listing indexes"""
+    return _listing_shard(zlib.crc32(tile_pool_id.encode()) % LISTING_SHARDS)
+
+
+def _name_key(name: str) -> str:
+    """Return the sort key of a name, cut short to fit in a key"""
+    # key attributes cannot be empty, and the prefix keeps names in order
+    return "n" + name.encode()[:NAME_KEY_BYTES].decode(errors="ignore")
+
+
+def _chunk_id(tile_pool_id: str, chunk: int, chunk_set: str = "") -> str:
+    return f"{tile_pool_id}#{chunk_set}-{chunk}" if chunk_set else f"{tile_pool_id}#{chunk}"
+
+
+def _chunk_ids(tile_pool_id: str, layout: Layout) -> list[str]:
+    chunks, chunk_set = layout
+    return [_chunk_id(tile_pool_id, n, chunk_set) for n in range(chunks)]
+
+
+def _layout(item: dict) -> Layout:
+    """Return the layout of a pool item, in DynamoDB format"""
+    chunks = int(item["chunks"]["N"]) if "chunks" in item else 0
+    return chunks, item["chunkSet"]["S"] if "chunkSet" in item else ""
+
+
+def _chunk_of(text: str, chunks: int) -> int:
+    """Return the chunk holding the tile with text"""
+    return zlib.crc32(text.encode()) % chunks
+
+
+def _tile_to_dynamodb(tile: Tile) -> dict:
+    """Convert a tile straight to a DynamoDB map attribute value"""
+    return {
+        "M": {
+            "content": {"S": tile.text},
+            "tags": {"L": [{"S": tag} for tag in tile.tags]},
+            "imageUrl": {"S": tile.image_url} if tile.image_url else {"NULL": True},
+            "weight": {"N": str(tile.weight)},
+        }
+    }
+
+
+def _dynamodb_to_tile(value: dict) -> Tile:
+    """Convert a DynamoDB map attribute value straight to a tile"""
+    item = value["M"]
+    text = item["content"]["S"]
+    image_url = item["imageUrl"].get("S") if "imageUrl" in item else None
+    # tile lists rewritten by earlier updates stored image tiles by type
+    if not image_url and "type" in item and item["type"]["S"] == "image":
+        image_url = text
+    return Tile(
+        text,
+        frozenset(tag["S"] for tag in item["tags"]["L"]) if "tags" in item else frozenset(),
+        image_url or None,
+        float(item["weight"]["N"]) if "weight" in item else 1.0,
+    )
+
+
+def _tile_size(tile: Tile) -> int:
+    """Size of the entry of a tile in a tile map, in bytes as DynamoDB counts them
+
+    Strings and attribute names count their UTF-8 bytes, a map or list counts 3 bytes plus 1
+    per element, null counts 1 byte and a number at most 21 bytes.
+    """
+    text = len(tile.text.encode())
+    image_url = len(tile.image_url.encode()) if tile.image_url else 1
+    tags = sum(len(tag.encode()) + 1 for tag in tile.tags)
+    # the text is both the key of the entry and its content, the rest is attribute names
+    # and the overhead of the map
+    return 2 * text + image_url + tags + 57
+
 
 class DynamoTilePoolDB(TilePoolDB):
+    """TilePools stored as items of a DynamoDB table keyed by id
+
+    Every pool has a listing attribute spreading pools over LISTING_SHARDS partitions of a
+    global secondary index per sort method. Listings query every partition of the index of
+    their sort method for the ids of a page, merge them, and then fetch only those items, so
+    they never scan the table. Names are sorted by a nameKey attribute holding their start.
+
+    Tiles are stored in a map keyed by their text, so tile updates set and remove entries of
+    the map in place and concurrent updates of different tiles do not conflict. Each update
+    increments the revision of the pool. Pools stored with a list of tiles are converted to
+    a map on their first update.
+
+    Large pools split their tile map across chunk items with ids of the form "<id>#<n>", a
+    tile going to the chunk chosen by the hash of its text. The pool item then only records
+    the number of chunks and the set they belong to. Chunks are written, read and updated
+    concurrently through a thread pool.
+
+    Every item holding tiles counts the tile data inserted into it. Once an item may hold
+    more than INLINE_TILE_BYTES its tiles are measured, and if it holds more than SPLIT_BYTES
+    the pool is moved to a new set of "<id>#<set>-<n>" chunks, so pools keep fitting under
+    the item size limit as they grow.
+    """
+
     def __init__(self, table_name: str = "BingoMaker", endpoint_url: str | None = None):
         if endpoint_url:
             self.client = boto3.client(
@@ -17,88 +171,198 @@ class DynamoTilePoolDB(TilePoolDB):
             self.client = boto3.client("dynamodb", region_name="us-east-1")
         self.table_name = table_name
 
+    def _value_to_dynamodb(self, value):
+        """Convert a value to a DynamoDB attribute value"""
+        # bool is a subclass of int, so it has to be checked first
+        if isinstance(value, bool):
+            return {"BOOL": value}
+        if isinstance(value, str):
+            return {"S": value}
+        if isinstance(value, int | float):
+            return {"N": str(value)}
+        if value is None:
+            return {"NULL": True}
+        if isinstance(value, list):
+            return {"L": [self._value_to_dynamodb(v) for v in value]}
+        if isinstance(value, dict):
+            return {"M": self._dict_to_dynamodb(value)}
+        raise TypeError(f"Unsupported type: {type(value)}")
+
     def _dict_to_dynamodb(self, attr_dict):
         """Convert a standard dictionary to DynamoDB format."""
-        dynamodb_dict = {}
-
-        for key, value in attr_dict.items():
-            # String
-            if isinstance(value, str):
-                dynamodb_dict[key] = {"S": value}
-            # Number (int or float)
-            elif isinstance(value, int | float):
-                dynamodb_dict[key] = {"N": str(value)}
-            # Boolean
-            elif isinstance(value, bool):
-                dynamodb_dict[key] = {"BOOL": value}
-            # NoneType
-            elif value is None:
-                dynamodb_dict[key] = {"NULL": True}
-            # List
-            elif isinstance(value, list):
-                dynamodb_dict[key] = {"L": [self._dict_to_dynamodb({"": v})[""] for v in value]}
-            # Dictionary
-            elif isinstance(value, dict):
-                dynamodb_dict[key] = {"M": self._dict_to_dynamodb(value)}
-            else:
-                raise TypeError(f"Unsupported type for {key}: {type(value)}")
-
-        return dynamodb_dict
+        return {key: self._value_to_dynamodb(value) for key, value in attr_dict.items()}
+
+    def _value_to_python(self, value):
+        """Convert a DynamoDB attribute value to a standard Python value"""
+        if "S" in value:
+            return value["S"]
+        if "N" in value:
+            number = value["N"]
+            return float(number) if any(c in number for c in ".eE") else int(number)
+        if "BOOL" in value:
+            return value["BOOL"]
+        if "NULL" in value:
+            return None
+        if "L" in value:
+            return [self._value_to_python(v) for v in value["L"]]
+        if "M" in value:
+            return self._dynamodb_to_dict(value["M"])
+        raise TypeError(f"Unsupported DynamoDB type: {value}")
 
     def _dynamodb_to_dict(self, dynamodb_dict):
         """Convert a DynamoDB formatted dictionary to a standard Python dictionary."""
-        attr_dict = {}
-
-        for key, value in dynamodb_dict.items():
-            # Process each attribute type
-            if "S" in value:
-                attr_dict[key] = value["S"]
-            elif "N" in value:
-                attr_dict[key] = float(value["N"]) if "." in value["N"] else int(value["N"])
-            elif "BOOL" in value:
-                attr_dict[key] = value["BOOL"]
-            elif "NULL" in value:
-                attr_dict[key] = None
-            elif "L" in value:
-                attr_dict[key] = [self._dynamodb_to_dict({"": v})[""] for v in value["L"]]
-            elif "M" in value:
-                attr_dict[key] = self._dynamodb_to_dict(value["M"])
-            else:
-                raise TypeError(f"Unsupported DynamoDB type for {key}")
+        return {key: self._value_to_python(value) for key, value in dynamodb_dict.items()}
+
+    @functools.cached_property
+    def _executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(CHUNK_WORKERS)
+
+    @functools.cached_property
+    def _layouts(self) -> dict[str, Layout]:
+        """Layouts of chunked pools, refreshed whenever an update finds one out of date"""
+        return {}
+
+    def _batch_write(self, requests: list[dict]):
+        """Run write requests with concurrent BatchWriteItem requests"""
+
+        def write(group: list[dict]):
+            items = {self.table_name: group}
+            for attempt in range(BATCH_ATTEMPTS):
+                if attempt:
+                    time.sleep(BACKOFF_SECONDS * 2 ** (attempt - 1))
+                response = self.client.batch_write_item(RequestItems=items)
+                if not (items := response.get("UnprocessedItems")):
+                    return
+            raise RuntimeError(f"Unable to write {len(items[self.table_name])} items")
+
+        groups = [
+            requests[start : start + BATCH_WRITE_LIMIT]
+            for start in range(0, len(requests), BATCH_WRITE_LIMIT)
+        ]
+        list(self._executor.map(write, groups))
+
+    def _batch_get(self, ids: list[str], consistent: bool = False) -> dict[str, dict]:
+        """Fetch items by id with concurrent BatchGetItem requests, in DynamoDB format"""
+
+        def fetch(keys: list[dict]) -> list[dict]:
+            items = []
+            request = {self.table_name: {"Keys": keys, "ConsistentRead": consistent}}
+            for attempt in range(BATCH_ATTEMPTS):
+                if attempt:
+                    time.sleep(BACKOFF_SECONDS * 2 ** (attempt - 1))
+                response = self.client.batch_get_item(RequestItems=request)
+                items.extend(response["Responses"].get(self.table_name, []))
+                if not (request := response.get("UnprocessedKeys")):
+                    return items
+            raise RuntimeError(f"Unable to read {len(request[self.table_name]['Keys'])} items")
+
+        groups = [
+            [{"id": {"S": id_}} for id_ in ids[start : start + BATCH_GET_LIMIT]]
+            for start in range(0, len(ids), BATCH_GET_LIMIT)
+        ]
+        return {
+            item["id"]["S"]: item
+            for item in itertools.chain.from_iterable(self._executor.map(fetch, groups))
+        }
+
+    def _put_chunks(
+        self, tile_pool_id: str, layout: Layout, entries: Iterable[tuple[str, dict, int]]
+    ):
+        """Write tile map entries, given with their sizes, into the chunks of a layout"""
+        chunks, chunk_set = layout
+        maps: list[dict] = [{} for _ in range(chunks)]
+        sizes = [0] * chunks
+        for text, value, size in entries:
+            maps[n := _chunk_of(text, chunks)][text] = value
+            sizes[n] += size
+        self._batch_write(
+            [
+                {
+                    "PutRequest": {
+                        "Item": {
+                            "id": {"S": _chunk_id(tile_pool_id, n, chunk_set)},
+                            "tileMap": {"M": tile_map},
+                            "tileBytes": {"N": str(size)},
+                        }
+                    }
+                }
+                for n, (tile_map, size) in enumerate(zip(maps, sizes, strict=True))
+            ]
+        )
 
-        return attr_dict
+    def _delete_chunks(self, tile_pool_id: str, layout: Layout):
+        self._batch_write(
+            [
+                {"DeleteRequest": {"Key": {"id": {"S": id_}}}}
+                for id_ in _chunk_ids(tile_pool_id, layout)
+            ]
+        )
 
     def insert_tile_pool(self, name: str, owner: str, pool: TilePool) -> str | None:
         id_ = uuid4().hex
-        data = self._dict_to_dynamodb(
-            {
-                "id": id_,
-                "owner": owner,
-                "name": name,
-                "tiles": [
-                    {
-                        "content": tile.text,
-                        "tags": list(tile.tags),
-                        "imageUrl": tile.image_url,
-                    }
-                    for tile in pool.tiles
-                ],
-                "createdAt": datetime.datetime.now().isoformat(),
-                "freeTile": {
-                    "content": pool.free.text,
-                    "tags": list(pool.free.tags),
-                    "imageUrl": pool.free.image_url,
-                },
-            }
-        )
-        self.client.put_item(TableName=self.table_name, Item=data)
+        item = {
+            "id": id_,
+            "owner": owner,
+            "name": name,
+            "revision": 0,
+            "createdAt": datetime.datetime.now().isoformat(),
+            "listing": _listing(id_),
+            "nameKey": _name_key(name),
+            "freeTile": {
+                "content": pool.free.text,
+                "tags": list(pool.free.tags),
+                "imageUrl": pool.free.image_url,
+            },
+        }
+
+        data = self._dict_to_dynamodb(item)
+
+        sizes = [_tile_size(tile) for tile in pool.tiles]
+        if max(sizes, default=0) > INLINE_TILE_BYTES:
+            print("Tile too large to store")
+            return None
+
+        layout: Layout = (0, "")
+        try:
+            if sum(sizes) <= INLINE_TILE_BYTES:
+                data["tileMap"] = {"M": {tile.text: _tile_to_dynamodb(tile) for tile in pool.tiles}}
+                data["tileBytes"] = {"N": str(sum(sizes))}
+            else:
+                # chunks are written first, so a pool item is never missing its tiles
+                layout = (-(-sum(sizes) // CHUNK_BYTES), "")
+                self._put_chunks(
+                    id_,
+                    layout,
+                    (
+                        (tile.text, _tile_to_dynamodb(tile), size)
+                        for tile, size in zip(pool.tiles, sizes, strict=True)
+                    ),
+                )
+                data["chunks"] = {"N": str(layout[0])}
+                self._layouts[id_] = layout
+
+            self.client.put_item(TableName=self.table_name, Item=data)
+        except ClientError as e:
+            # items over the 400KB limit are rejected with a ValidationException
+            print(f"Error inserting tile pool: {e}")
+            self._layouts.pop(id_, None)
+            with contextlib.suppress(ClientError, RuntimeError):
+                self._delete_chunks(id_, layout)
+            return None
 
         return id_
 
     def delete_tile_pool(self, tile_pool_id: str) -> bool:
         print(f"Deleting tile pool with ID: {tile_pool_id}")
         try:
+            response = self.client.get_item(
+                TableName=self.table_name,
+                Key={"id": {"S": tile_pool_id}},
+                ProjectionExpression="chunks, chunkSet",
+            )
             self.client.delete_item(TableName=self.table_name, Key={"id": {"S": tile_pool_id}})
+            self._delete_chunks(tile_pool_id, _layout(response.get("Item", {})))
+            self._layouts.pop(tile_pool_id, None)
             print("Deletion successful")
             return True
         except Exception as e:
@@ -106,141 +370,583 @@ class DynamoTilePoolDB(TilePoolDB):
             return False
 
     def delete_tile_pool_by_owner(self, owner: str) -> bool:
+        print(f"Deleting tile pools of owner: {owner}")
         try:
-            # Use expression attribute names to avoid the reserved keyword issue
-            response = self.client.scan(
-                TableName=self.table_name,
-                FilterExpression="#o = :owner",
-                ExpressionAttributeNames={"#o": "owner"},
-                ExpressionAttributeValues={":owner": {"S": owner}},
-            )
-
-            # Extract the IDs of items to delete
-            items = response.get("Items", [])
-            print(f"Found {len(items)} items to delete for owner '{owner}'")
+            deleted = 0
+            for n in range(LISTING_SHARDS):
+                kwargs = {
+                    "TableName": self.table_name,
+                    "IndexName": LISTING_INDEXES[SortMethod.OWNER],
+                    "KeyConditionExpression": "#l = :listing AND #o = :owner",
+                    "ExpressionAttributeNames": {
+                        "#l": "listing",
+                        "#o": "owner",
+                        "#c": "chunks",
+                        "#cs": "chunkSet",
+                    },
+                    "ExpressionAttributeValues": {
+                        ":listing": {"S": _listing_shard(n)},
+                        ":owner": {"S": owner},
+                    },
+                    "ProjectionExpression": "id, #c, #cs",
+                }
+                while True:
+                    # pools are deleted before their chunks, so no pool is left without its tiles
+                    response = self.client.query(**kwargs)
+                    items = response.get("Items", [])
+                    self._batch_write(
+                        [{"DeleteRequest": {"Key": {"id": item["id"]}}} for item in items]
+                    )
+                    self._batch_write(
+                        [
+                            {"DeleteRequest": {"Key": {"id": {"S": id_}}}}
+                            for item in items
+                            for id_ in _chunk_ids(item["id"]["S"], _layout(item))
+                        ]
+                    )
+                    for item in items:
+                        self._layouts.pop(item["id"]["S"], None)
+                    deleted += len(items)
 
-            # Delete each item individually
-            for item in items:
-                item = self._dynamodb_to_dict(item)
-                id_ = item["id"]
-                self.client.delete_item(TableName=self.table_name, Key={"id": {"S": id_}})
-                print(f"Deleted item with id: {id_}")
+                    if "LastEvaluatedKey" not in response:
+                        break
+                    kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
 
-            print("Deletion successful")
+            print(f"Deleted {deleted} tile pools")
             return True
         except Exception as e:
             print(f"Error deleting items by owner: {e}")
             return False
 
-    def update_tiles(self, tile_pool_id, removals=None, insertions=None):
-        print(
-            f"Updating tiles for pool ID: {tile_pool_id}, \
-                removals: {removals}, insertions: {insertions}"
+    def _apply_tile_changes(
+        self, item_id: str, removals: list[str], insertions: dict[str, tuple[dict, int]]
+    ) -> int:
+        """Set and remove entries of the tile map of an item, in as few requests as possible
+
+        Returns the tile data counted for the item, which only grows with insertions since
+        the sizes of removed tiles are unknown.
+
+        Raises:
+            ConditionalCheckFailedException: the item does not exist, has no tile map or has
+                been sealed by a split
+        """
+        changes = [(text, None) for text in removals] + list(insertions.items())
+        counted = 0
+        for start in range(0, len(changes), CHANGES_PER_UPDATE):
+            names = {"#m": "tileMap", "#r": "revision", "#s": "sealed"}
+            values = {":one": {"N": "1"}}
+            sets, removes = [], []
+            size = 0
+            for i, (text, change) in enumerate(changes[start : start + CHANGES_PER_UPDATE]):
+                names[f"#t{i}"] = text
+                if change is None:
+                    removes.append(f"#m.#t{i}")
+                else:
+                    values[f":t{i}"], tile_size = change
+                    sets.append(f"#m.#t{i} = :t{i}")
+                    size += tile_size
+
+            expression = "ADD #r :one"
+            if sets:
+                # removals can only shrink the item, so only insertions are counted
+                expression += ", #b :size SET " + ", ".join(sets)
+                names["#b"] = "tileBytes"
+                values[":size"] = {"N": str(size)}
+            if removes:
+                expression += " REMOVE " + ", ".join(removes)
+            response = self.client.update_item(
+                TableName=self.table_name,
+                Key={"id": {"S": item_id}},
+                UpdateExpression=expression,
+                ConditionExpression="attribute_exists(#m) AND attribute_not_exists(#s)",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ReturnValues="UPDATED_NEW",
+            )
+            if sets:
+                counted = int(response["Attributes"]["tileBytes"]["N"])
+        return counted
+
+    def _apply_chunked_changes(
+        self,
+        tile_pool_id: str,
+        layout: Layout,
+        removals: list[str],
+        insertions: dict[str, tuple[dict, int]],
+    ) -> list[str]:
+        """Update the chunks holding the changed tiles concurrently
+
+        Returns the ids of the changed chunks counted as holding more than INLINE_TILE_BYTES.
+
+        Raises:
+            ConditionalCheckFailedException: the pool or one of its chunks does not exist, or
+                a chunk has been sealed by a split
+        """
+        chunks, chunk_set = layout
+        changes: dict[int, tuple[list[str], dict[str, tuple[dict, int]]]] = {}
+        for text in removals:
+            changes.setdefault(_chunk_of(text, chunks), ([], {}))[0].append(text)
+        for text, change in insertions.items():
+            changes.setdefault(_chunk_of(text, chunks), ([], {}))[1][text] = change
+
+        futures = {
+            _chunk_id(tile_pool_id, n, chunk_set): self._executor.submit(
+                self._apply_tile_changes,
+                _chunk_id(tile_pool_id, n, chunk_set),
+                removed,
+                inserted,
+            )
+            for n, (removed, inserted) in changes.items()
+        }
+        full = [id_ for id_, future in futures.items() if future.result() > INLINE_TILE_BYTES]
+
+        self.client.update_item(
+            TableName=self.table_name,
+            Key={"id": {"S": tile_pool_id}},
+            UpdateExpression="ADD #r :one",
+            ConditionExpression="attribute_exists(id)",
+            ExpressionAttributeNames={"#r": "revision"},
+            ExpressionAttributeValues={":one": {"N": "1"}},
         )
-        if removals is None and insertions is None:
-            print("No changes to update")
-            return False
-
-        current_pool = self.get_tile_pool(tile_pool_id)
-        if current_pool is None:
-            print("Tile pool not found")
-            return False
+        return full
+
+    def _check_size(self, tile_pool_id: str, item_id: str):
+        """Count the tile data of an item which may hold too much, splitting its pool if it does"""
+        response = self.client.get_item(
+            TableName=self.table_name,
+            Key={"id": {"S": item_id}},
+            ConsistentRead=True,
+            ProjectionExpression="#m, #b",
+            ExpressionAttributeNames={"#m": "tileMap", "#b": "tileBytes"},
+        )
+        if "tileMap" not in (item := response.get("Item", {})):
+            return
 
+        size = sum(_tile_size(_dynamodb_to_tile(value)) for value in item["tileMap"]["M"].values())
+        if size > SPLIT_BYTES:
+            self._split(tile_pool_id)
+            return
         try:
-            if removals:
-                old_pool = current_pool["tiles"]
-                new_tiles = frozenset(tile for tile in old_pool.tiles if tile.text not in removals)
-                self._update_tiles(tile_pool_id, new_tiles)
-                print("Removed tiles successfully")
-
-            if removals and insertions:
-                current_pool = self.get_tile_pool(tile_pool_id)
-                if current_pool is None:
-                    print("Tile pool not found")
-                    return False
-
-            if insertions:
-                old_pool = current_pool["tiles"]
-
-                new_pool = list(old_pool.tiles) + insertions
-                print(f"New pool: {new_pool}")
+            # a count which changed since the read includes insertions the size does not
+            self.client.update_item(
+                TableName=self.table_name,
+                Key={"id": {"S": item_id}},
+                UpdateExpression="SET #b = :size",
+                ConditionExpression="#b = :counted",
+                ExpressionAttributeNames={"#b": "tileBytes"},
+                ExpressionAttributeValues={
+                    ":size": {"N": str(size)},
+                    ":counted": item["tileBytes"],
+                },
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    def _split(self, tile_pool_id: str) -> bool:
+        """Move the tiles of a pool into a new set of at least twice as many chunks
+
+        Chunks being replaced are sealed before they are read, so updates of them fail and are
+        retried on the new chunks instead of being lost. Updates of an inline pool increment
+        its revision, which is checked when the new chunks replace its tile map. Returns if the
+        pool now uses the new chunks.
+        """
+        response = self.client.get_item(
+            TableName=self.table_name, Key={"id": {"S": tile_pool_id}}, ConsistentRead=True
+        )
+        if "Item" not in response:
+            return False
+        item = response["Item"]
+        chunks, chunk_set = layout = _layout(item)
+
+        values: dict[str, dict] = {":one": {"N": "1"}}
+        if chunks:
+            try:
+                list(
+                    self._executor.map(
+                        lambda id_: self.client.update_item(
+                            TableName=self.table_name,
+                            Key={"id": {"S": id_}},
+                            UpdateExpression="SET #s = :sealed",
+                            ConditionExpression="attribute_exists(id)",
+                            ExpressionAttributeNames={"#s": "sealed"},
+                            ExpressionAttributeValues={":sealed": {"BOOL": True}},
+                        ),
+                        _chunk_ids(tile_pool_id, layout),
+                    )
+                )
+            except ClientError as e:
+                # another split replaced the chunks first
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                return False
+            tile_map: dict[str, dict] = {}
+            for chunk in self._batch_get(
+                _chunk_ids(tile_pool_id, layout), consistent=True
+            ).values():
+                tile_map.update(chunk["tileMap"]["M"])
+            condition = "#c = :chunks AND "
+            condition += "#cs = :set" if chunk_set else "attribute_not_exists(#cs)"
+            values[":chunks"] = item["chunks"]
+            if chunk_set:
+                values[":set"] = item["chunkSet"]
+        elif "tileMap" in item:
+            tile_map = item["tileMap"]["M"]
+            condition = "#r = :revision AND attribute_exists(#m)"
+            values[":revision"] = item["revision"]
+        else:
+            return False
 
-                self._update_tiles(tile_pool_id, new_pool)
-                print("Inserted tiles successfully")
+        entries = [
+            (text, value, _tile_size(_dynamodb_to_tile(value))) for text, value in tile_map.items()
+        ]
+        size = sum(size for *_, size in entries)
+        new_layout = (max(-(-size // CHUNK_BYTES), 2 * chunks, 1), uuid4().hex[:8])
+        values[":count"] = {"N": str(new_layout[0])}
+        values[":new_set"] = {"S": new_layout[1]}
 
-            return True
-        except Exception as e:
-            print(f"Error updating tiles: {e}")
+        self._put_chunks(tile_pool_id, new_layout, entries)
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key={"id": {"S": tile_pool_id}},
+                UpdateExpression="SET #c = :count, #cs = :new_set REMOVE #m, #b ADD #r :one",
+                ConditionExpression=condition,
+                ExpressionAttributeNames={
+                    "#c": "chunks",
+                    "#cs": "chunkSet",
+                    "#m": "tileMap",
+                    "#b": "tileBytes",
+                    "#r": "revision",
+                },
+                ExpressionAttributeValues=values,
+            )
+        except ClientError as e:
+            self._delete_chunks(tile_pool_id, new_layout)
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
             return False
 
-    def _update_tiles(self, tile_pool_id, new_pool):
-        print(f"Updating pool for ID: {tile_pool_id} with new pool data")
+        self._layouts[tile_pool_id] = new_layout
+        self._delete_chunks(tile_pool_id, layout)
+        print(f"Split tile pool into {new_layout[0]} chunks")
+        return True
 
-        new_tiles_list = [tile_to_dict(tile) for tile in new_pool]
+    def _prepare_update(self, tile_pool_id: str) -> Layout | None:
+        """Return the layout of a pool, or None if it does not exist
 
-        new_pool_dynamodb = self._dict_to_dynamodb({"new_pool": new_tiles_list})
+        A pool storing a list of tiles is converted to a tile map or chunks first.
+        """
+        response = self.client.get_item(
+            TableName=self.table_name, Key={"id": {"S": tile_pool_id}}, ConsistentRead=True
+        )
+        if "Item" not in response:
+            return None
 
+        item = response["Item"]
+        if "chunks" in item:
+            layout = self._layouts[tile_pool_id] = _layout(item)
+            return layout
+        self._layouts.pop(tile_pool_id, None)
+        if "tileMap" in item:
+            return (0, "")
+
+        tiles = self._to_result(item)["tiles"].tiles
+        sizes = [_tile_size(tile) for tile in tiles]
+        names = {"#m": "tileMap", "#c": "chunks", "#r": "revision"}
+        values = {":zero": {"N": "0"}}
+        if sum(sizes) <= INLINE_TILE_BYTES:
+            layout = (0, "")
+            expression = "SET #m = :map, #b = :size, #r = :zero REMOVE tiles"
+            names["#b"] = "tileBytes"
+            values[":map"] = {"M": {tile.text: _tile_to_dynamodb(tile) for tile in tiles}}
+            values[":size"] = {"N": str(sum(sizes))}
+        else:
+            layout = (-(-sum(sizes) // CHUNK_BYTES), uuid4().hex[:8])
+            self._put_chunks(
+                tile_pool_id,
+                layout,
+                (
+                    (tile.text, _tile_to_dynamodb(tile), size)
+                    for tile, size in zip(tiles, sizes, strict=True)
+                ),
+            )
+            expression = "SET #c = :count, #cs = :set, #r = :zero REMOVE tiles"
+            names["#cs"] = "chunkSet"
+            values[":count"] = {"N": str(layout[0])}
+            values[":set"] = {"S": layout[1]}
         try:
             self.client.update_item(
                 TableName=self.table_name,
                 Key={"id": {"S": tile_pool_id}},
-                UpdateExpression="SET tiles = :new_pool",
-                ExpressionAttributeValues={":new_pool": new_pool_dynamodb["new_pool"]},
+                UpdateExpression=expression,
+                ConditionExpression="attribute_not_exists(#m) AND attribute_not_exists(#c)",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
             )
-            print("Update successful")
-            return True
+        except ClientError as e:
+            if layout[0]:
+                self._delete_chunks(tile_pool_id, layout)
+            # another update converted the pool first
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return self._prepare_update(tile_pool_id)
+        if layout[0]:
+            self._layouts[tile_pool_id] = layout
+        return layout
+
+    def _update(
+        self, tile_pool_id: str, removals: list[str], insertions: dict[str, tuple[dict, int]]
+    ) -> list[str] | None:
+        """Apply tile changes to the current layout of a pool
+
+        Returns the ids of the changed items counted as holding more than INLINE_TILE_BYTES,
+        or None if the pool does not exist or kept changing.
+        """
+        layout = self._layouts.get(tile_pool_id, (0, ""))
+        for _ in range(UPDATE_ATTEMPTS):
+            try:
+                if layout[0]:
+                    return self._apply_chunked_changes(tile_pool_id, layout, removals, insertions)
+                counted = self._apply_tile_changes(tile_pool_id, removals, insertions)
+                return [tile_pool_id] if counted > INLINE_TILE_BYTES else []
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+            previous, layout = layout, self._prepare_update(tile_pool_id)
+            if layout is None:
+                print("Tile pool not found")
+                return None
+            if layout[0] and layout == previous:
+                # the chunks were sealed by a split which did not finish
+                self._split(tile_pool_id)
+                layout = self._layouts.get(tile_pool_id, layout)
+        print("Tile pool changed during update")
+        return None
+
+    def update_tiles(self, tile_pool_id, removals=None, insertions=None):
+        print(
+            f"Updating tiles for pool ID: {tile_pool_id}, \
+                removals: {removals}, insertions: {insertions}"
+        )
+        if not removals and not insertions:
+            print("No changes to update")
+            return False
+
+        # setting a tile replaces the tile with its text, so it does not need removing
+        inserted = {
+            tile.text: (_tile_to_dynamodb(tile), _tile_size(tile)) for tile in insertions or ()
+        }
+        removed = [text for text in dict.fromkeys(removals or ()) if text not in inserted]
+
+        # insertions are applied a chunk's worth at a time, checking the items they grew in
+        # between, so no item grows from INLINE_TILE_BYTES past the item size limit
+        groups: list[dict[str, tuple[dict, int]]] = [{}]
+        size = 0
+        for text, change in inserted.items():
+            if groups[-1] and size + change[1] > CHUNK_BYTES:
+                groups.append({})
+                size = 0
+            groups[-1][text] = change
+            size += change[1]
+
+        try:
+            for n, group in enumerate(groups):
+                if (full := self._update(tile_pool_id, [] if n else removed, group)) is None:
+                    return False
+                for item_id in full:
+                    self._check_size(tile_pool_id, item_id)
         except Exception as e:
-            print(f"Error in _update_tiles: {e}")
+            print(f"Error updating tiles: {e}")
             return False
 
+        print("Updated tiles successfully")
+        return True
+
+    def _to_result(self, item: dict, chunks: Iterable[dict] = ()) -> DBResult:
+        """Build a pool from its item and the items of its chunks, in DynamoDB format"""
+        values = [item["tileMap"]["M"].values() if "tileMap" in item else ()]
+        if "tiles" in item:
+            values.append(item["tiles"]["L"])
+        values.extend(chunk["tileMap"]["M"].values() for chunk in chunks)
+        tiles = frozenset(map(_dynamodb_to_tile, itertools.chain.from_iterable(values)))
+        free = _dynamodb_to_tile(item["freeTile"]) if "freeTile" in item else Tile("")
+
+        return {
+            "owner": item["owner"]["S"],
+            "name": item["name"]["S"],
+            "tiles": TilePool(tiles, free),
+            "id": item["id"]["S"],
+            "created_at": item["createdAt"]["S"],
+        }
+
+    def _query_ids(
+        self, sort: SortMethod, sort_asc: bool, limit: int | None, start_keys: dict | None
+    ) -> tuple[list[str], dict | None]:
+        """Query up to limit pool ids in sorted order across every listing shard
+
+        start_keys holds the key each shard continues from, with shards missing from it read
+        from their start. Returns the keys to continue from, or None once every shard is read.
+        """
+        index = LISTING_INDEXES[sort]
+        sort_key = INDEX_SORT_KEYS[index]
+        start_keys = dict(start_keys or {})
+
+        def shard(listing: str) -> Iterator[tuple[str, str, dict]]:
+            """Yield the sort key, id and index key of the pools of a shard in order"""
+            kwargs = {
+                "TableName": self.table_name,
+                "IndexName": index,
+                "KeyConditionExpression": "#l = :listing",
+                "ExpressionAttributeNames": {"#l": "listing", "#k": sort_key},
+                "ExpressionAttributeValues": {":listing": {"S": listing}},
+                "ProjectionExpression": "id, #l, #k",
+                "ScanIndexForward": sort_asc,
+            }
+            if limit is not None:
+                kwargs["Limit"] = limit
+            if listing in start_keys:
+                kwargs["ExclusiveStartKey"] = start_keys[listing]
+            while True:
+                response = self.client.query(**kwargs)
+                for item in response.get("Items", []):
+                    yield item[sort_key]["S"], item["id"]["S"], item
+                if "LastEvaluatedKey" not in response:
+                    return
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        # each shard is sorted on its own, so they are merged by their next pool
+        merged = heapq.merge(
+            *(shard(_listing_shard(n)) for n in range(LISTING_SHARDS)),
+            key=lambda pool: pool[:2],
+            reverse=not sort_asc,
+        )
+        ids: list[str] = []
+        for _, id_, key in itertools.islice(merged, limit):
+            ids.append(id_)
+            start_keys[key["listing"]["S"]] = key
+        if next(merged, None) is None:
+            return ids, None
+        return ids, start_keys
+
+    def _load(self, items: list[dict]) -> list[DBResult]:
+        """Build pools from their items, fetching the chunks of chunked pools"""
+        chunk_ids = [_chunk_ids(item["id"]["S"], _layout(item)) for item in items]
+        chunks = self._batch_get(list(itertools.chain.from_iterable(chunk_ids)))
+
+        # a split may have replaced the chunks of a pool after its item was read
+        if stale := [i for i, ids in enumerate(chunk_ids) if not all(id_ in chunks for id_ in ids)]:
+            items = list(items)
+            fresh = self._batch_get([items[i]["id"]["S"] for i in stale], consistent=True)
+            for i in stale:
+                items[i] = fresh[items[i]["id"]["S"]]
+                chunk_ids[i] = _chunk_ids(items[i]["id"]["S"], _layout(items[i]))
+            chunks.update(
+                self._batch_get([id_ for i in stale for id_ in chunk_ids[i]], consistent=True)
+            )
+        return [
+            self._to_result(item, (chunks[id_] for id_ in ids))
+            for item, ids in zip(items, chunk_ids, strict=True)
+        ]
+
+    def _get_many(self, ids: list[str]) -> list[DBResult]:
+        """Fetch pools by id, in the order of ids"""
+        items = self._batch_get(ids)
+        return self._load([items[id_] for id_ in ids if id_ in items])
+
     def get_tile_pools(self, size=None, page=None, sort=SortMethod.DEFAULT, sort_asc=True):
         print(
             f"Getting tile pools, size: {size}, page: {page}, sort: {sort}, ascending: {sort_asc}"
         )
 
+        # listing without a size would read every pool in the table
         if size is None or size < 1:
             print(f"Invalid quantity: {size}")
             return
 
-        response = self.client.scan(TableName=self.table_name)
-        items = [self._dynamodb_to_dict(item) for item in response.get("Items", [])]
+        try:
+            # earlier pages are skipped over in the index, which only holds the ids
+            start_keys = None
+            if page is not None and page > 1:
+                _, start_keys = self._query_ids(sort, sort_asc, (page - 1) * size, None)
+                if start_keys is None:
+                    return []
+            ids, _ = self._query_ids(sort, sort_asc, size, start_keys)
+            return self._get_many(ids)
+        except Exception as e:
+            print(f"Error retrieving tile pools: {e}")
+            return
+
+    def get_tile_pools_page(self, size, cursor=None, sort=SortMethod.DEFAULT, sort_asc=True):
+        if size < 1:
+            return
 
-        sorted_items = self.sort(items, sort, sort_asc)
+        index = LISTING_INDEXES[sort]
+        start_keys = None
+        if cursor is not None:
+            position = decode_cursor(cursor)
+            if position.get("index") != index or position.get("asc") != sort_asc:
+                raise ValueError("Invalid cursor")
+            start_keys = position.get("keys")
+            listings = {_listing_shard(n) for n in range(LISTING_SHARDS)}
+            attributes = {"id", "listing", INDEX_SORT_KEYS[index]}
+            if not isinstance(start_keys, dict) or not all(
+                listing in listings
+                and isinstance(key, dict)
+                and key.keys() == attributes
+                and all(isinstance(value, dict) and value.keys() == {"S"} for value in key.values())
+                and key["listing"]["S"] == listing
+                for listing, key in start_keys.items()
+            ):
+                raise ValueError("Invalid cursor")
 
-        start_index, end_index = self.paginate(len(sorted_items), size, page)
-        paginated_items = sorted_items[start_index:end_index]
+        try:
+            ids, start_keys = self._query_ids(sort, sort_asc, size, start_keys)
+            results = self._get_many(ids)
+        except Exception as e:
+            print(f"Error retrieving tile pools: {e}")
+            return
 
-        def get_pool(item) -> TilePool:
-            tiles_data = item["tiles"]
-            tiles = frozenset(
-                Tile(
-                    text=tile.get("content"),
-                    tags=frozenset(tag for tag in tile.get("tags")),
-                    image_url=tile.get("imageUrl") or None,
+        if start_keys is None:
+            return results, None
+        position = {"index": index, "asc": sort_asc, "keys": start_keys}
+        return results, encode_cursor(position)
+
+    def migrate_listings(self) -> int:
+        """Move pools into their listing partitions and name keys, returning how many moved
+
+        Pools stored before the listing indexes, or before their current layout, are missing
+        from listings until this has run.
+        """
+        migrated = 0
+        kwargs = {
+            "TableName": self.table_name,
+            "ProjectionExpression": "id, #l, #n, #k",
+            # chunks have no creation time and are never listed
+            "FilterExpression": "attribute_exists(createdAt)",
+            "ExpressionAttributeNames": {"#l": "listing", "#n": "name", "#k": "nameKey"},
+        }
+        while True:
+            response = self.client.scan(**kwargs)
+            for item in response.get("Items", []):
+                listing, name_key = _listing(item["id"]["S"]), _name_key(item["name"]["S"])
+                if item.get("listing") == {"S": listing} and item.get("nameKey") == {"S": name_key}:
+                    continue
+                self.client.update_item(
+                    TableName=self.table_name,
+                    Key={"id": item["id"]},
+                    UpdateExpression="SET #l = :listing, #k = :name_key",
+                    ConditionExpression="attribute_exists(id)",
+                    ExpressionAttributeNames={"#l": "listing", "#k": "nameKey"},
+                    ExpressionAttributeValues={
+                        ":listing": {"S": listing},
+                        ":name_key": {"S": name_key},
+                    },
                 )
-                for tile in tiles_data
-            )
-            free_tile_data = item.get("freeTile", {})
-            img_url = free_tile_data.get("imageUrl", "")
-            if not img_url:
-                img_url = None
-            free = Tile(
-                text=free_tile_data.get("content", ""),
-                tags=frozenset(free_tile_data.get("tags", [])),
-                image_url=img_url,
-            )
-            return TilePool(tiles, free)
-
-        return [
-            {
-                "owner": item["owner"],
-                "name": item["name"],
-                "tiles": get_pool(item),
-                "id": item["id"],
-                "created_at": item["createdAt"],
-            }
-            for item in paginated_items
-        ]
+                migrated += 1
+            if "LastEvaluatedKey" not in response:
+                return migrated
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
 
     def get_tile_pool(self, tile_pool_id: str) -> DBResult | None:
         print(f"Retrieving tile pool with ID: {tile_pool_id}")
@@ -249,40 +955,9 @@ class DynamoTilePoolDB(TilePoolDB):
                 TableName=self.table_name, Key={"id": {"S": tile_pool_id}}
             )
 
-            if "Item" in response:
-                item = self._dynamodb_to_dict(response["Item"])
-
-                tiles_data = item["tiles"]
-                tiles = frozenset(
-                    Tile(
-                        text=tile.get("content"),
-                        tags=frozenset(tag for tag in tile.get("tags")),
-                        image_url=tile.get("imageUrl") or None,
-                    )
-                    for tile in tiles_data
-                )
-
-                free_tile_data = item.get("freeTile", {})
-                img_url = free_tile_data.get("imageUrl", "")
-                if not img_url:
-                    img_url = None
-                free = Tile(
-                    text=free_tile_data.get("content", ""),
-                    tags=frozenset(free_tile_data.get("tags", [])),
-                    image_url=img_url,
-                )
-
-                print(f"!!Free tile: {free}")
-                pool = TilePool(tiles, free)
-
-                # Create the DBResult using standard dictionary accesses
-                db_result: DBResult = {
-                    "owner": item["owner"],
-                    "name": item["name"],
-                    "tiles": pool,
-                    "id": item["id"],
-                    "created_at": item["createdAt"],
-                }
+            # chunk ids are not pool ids
+            if "Item" in response and "#" not in tile_pool_id:
+                db_result = self._load([response["Item"]])[0]
                 print(f"Tile pool retrieved successfully: {db_result}")
                 return db_result
 
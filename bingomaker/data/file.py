@@ -1,9 +1,13 @@
+import contextlib
+import datetime
+import fcntl
 import json
 import os
+import sqlite3
 import uuid
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
 from pathlib import Path
-from typing import TextIO
+from typing import BinaryIO, Literal
 
 from bingomaker.data.persistence import DBResult, SortMethod, TilePoolDB, dict_to_tile, tile_to_dict
 from bingomaker.game.game import Tile, TilePool
@@ -20,7 +24,35 @@ def read_text(path: str) -> TilePool:
 
 
 class FileTilePoolDB(TilePoolDB):
-    def __init__(self, root_dir: str | Path):
+    """TilePools stored as JSON files in a directory per owner
+
+    Pools are located through a SQLite catalog of pool files and their metadata, kept in
+    the root directory and shared by every process using the same root. Listing pools only
+    reads the catalog and the files of the returned page. The catalog is rebuilt from the
+    files whenever it is missing or outdated.
+
+    Tile updates are appended to a journal next to the pool file and applied whenever the
+    pool is read, so an update costs the size of the change rather than of the pool. Once a
+    journal outgrows compact_bytes and half of its pool file it is compacted into a new pool
+    file. Pool files are replaced
+    atomically, and fsync decides whether writes are flushed to disk on every journal append
+    ("always"), only when pool files are written ("compact") or never.
+    """
+
+    INDEX_NAME = ".index.sqlite3"
+    JOURNAL_SUFFIX = ".journal"
+    _COLUMNS = ("id", "owner", "path", "name", "created_at")
+
+    def __init__(
+        self,
+        root_dir: str | Path,
+        fsync: Literal["always", "compact", "never"] = "compact",
+        compact_bytes: int = 64 * 1024,
+    ):
+        if fsync not in ("always", "compact", "never"):
+            raise ValueError(f"Invalid fsync policy: {fsync}")
+        self.fsync = fsync
+        self.compact_bytes = compact_bytes
         self.root = root_dir if isinstance(root_dir, Path) else Path(root_dir)
 
         if self.root.exists() and not self.root.is_dir():
@@ -29,11 +61,67 @@ class FileTilePoolDB(TilePoolDB):
         if not self.root.exists():
             self.root.mkdir()
 
+        self._index_path = self.root / self.INDEX_NAME
+        rebuild = not self._index_path.exists()
+        with self._index() as conn:
+            columns = tuple(row[1] for row in conn.execute("PRAGMA table_info(pools)"))
+            if columns and columns != self._COLUMNS:
+                conn.execute("DROP TABLE pools")
+                rebuild = True
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pools (id TEXT PRIMARY KEY, owner TEXT NOT NULL, "
+                "path TEXT NOT NULL, name TEXT NOT NULL, created_at TEXT NOT NULL)"
+            )
+            # sorted pages are read straight from these indexes
+            for column in ("owner", "name", "created_at"):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS pools_{column} ON pools ({column})")
+        if rebuild:
+            self.rebuild_index()
+
+    @contextlib.contextmanager
+    def _index(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection to the index inside of a transaction
+
+        Connections are not reused, so the database can be shared across forked workers.
+        """
+        conn = sqlite3.connect(self._index_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def rebuild_index(self):
+        """Replace the catalog with the pools currently stored on disk"""
+        entries = []
+        for filepath, id_ in self._iterate_over_pools():
+            with open(filepath) as f:
+                unparsed = json.load(f)
+            entries.append(
+                (
+                    id_,
+                    unparsed["Owner"],
+                    str(filepath.relative_to(self.root)),
+                    unparsed["Name"],
+                    str(unparsed["CreatedAt"]),
+                )
+            )
+        with self._index() as conn:
+            conn.execute("DELETE FROM pools")
+            conn.executemany("INSERT OR REPLACE INTO pools VALUES (?, ?, ?, ?, ?)", entries)
+
     def _find_first_by_id(self, tile_pool_id: str) -> Path | None:
-        filename = f"{tile_pool_id}.json"
-        for dirpath, _, filenames in self.root.walk():
-            if filename in filenames:
-                return dirpath / filename
+        with self._index() as conn:
+            row = conn.execute("SELECT path FROM pools WHERE id = ?", (tile_pool_id,)).fetchone()
+            if row is None:
+                return None
+
+            filepath = self.root / row[0]
+            if not filepath.is_file():
+                # the file was removed without going through the database
+                conn.execute("DELETE FROM pools WHERE id = ?", (tile_pool_id,))
+                return None
+        return filepath
 
     def _iterate_over_pools(self) -> Iterable[tuple[Path, str]]:
         for dirpath, _, filenames in self.root.walk():
@@ -43,37 +131,137 @@ class FileTilePoolDB(TilePoolDB):
                 id_ = filename.rstrip(".json")
                 yield dirpath / filename, id_
 
-    def _parse(self, fp: TextIO, id_: str) -> DBResult:
-        unparsed = json.load(fp)
-        tiles = frozenset(dict_to_tile(item) for item in unparsed["Tiles"])
+    @contextlib.contextmanager
+    def _journal(self, filepath: Path, exclusive: bool) -> Iterator[BinaryIO | None]:
+        """Open and lock the journal of a pool file, if it has one
+
+        An exclusive lock creates the journal when it is missing. Readers hold a shared lock
+        while reading the pool file, so a compaction can not happen in between.
+        """
+        path = filepath.with_suffix(self.JOURNAL_SUFFIX)
+        while True:
+            with contextlib.ExitStack() as stack:
+                try:
+                    f = stack.enter_context(open(path, "ab+" if exclusive else "rb"))
+                except FileNotFoundError:
+                    f = None
+
+                if f is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                    # a compaction may have removed the journal while we waited for the lock
+                    if os.fstat(f.fileno()).st_nlink == 0:
+                        continue
+                yield f
+                return
+
+    def _sync(self, f: BinaryIO):
+        f.flush()
+        os.fsync(f.fileno())
+
+    def _write(self, filepath: Path, result: DBResult):
+        """Atomically replace a pool file with result"""
+        to_write = {
+            "Owner": result["owner"],
+            "Name": result["name"],
+            "Tiles": [tile_to_dict(tile) for tile in result["tiles"].tiles],
+            "CreatedAt": result["created_at"],
+        }
+        if result["tiles"].free:
+            to_write["FreeTile"] = tile_to_dict(result["tiles"].free)
+
+        temp = filepath.with_name(f".{filepath.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(temp, "wb") as f:
+                f.write(json.dumps(to_write).encode())
+                if self.fsync != "never":
+                    self._sync(f)
+            os.replace(temp, filepath)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+
+        if self.fsync != "never":
+            fd = os.open(filepath.parent, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _read(self, filepath: Path, id_: str) -> DBResult:
+        with self._journal(filepath, exclusive=False) as journal:
+            return self._parse(filepath, id_, journal)
+
+    def _parse(self, filepath: Path, id_: str, journal: BinaryIO | None) -> DBResult:
+        """Read a pool file and apply its locked journal"""
+        with open(filepath) as f:
+            unparsed = json.load(f)
+        entries = b""
+        if journal is not None:
+            journal.seek(0)
+            entries = journal.read()
+
+        # tiles grouped by text, so each journal entry only touches the tiles it names
+        by_text: dict[str, set[Tile]] = {}
+        for item in unparsed["Tiles"]:
+            tile = dict_to_tile(item)
+            by_text.setdefault(tile.text, set()).add(tile)
+        for line in entries.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # an append which was cut short
+                continue
+            for text in entry.get("remove", ()):
+                by_text.pop(text, None)
+            for item in entry.get("insert", ()):
+                tile = dict_to_tile(item)
+                by_text.setdefault(tile.text, set()).add(tile)
+        tiles = [tile for group in by_text.values() for tile in group]
+
         free = dict_to_tile(unparsed["FreeTile"]) if "FreeTile" in unparsed else None
-        pool = TilePool(tiles, free)
         return {
             "id": id_,
             "owner": unparsed["Owner"],
             "name": unparsed["Name"],
             "created_at": unparsed["CreatedAt"],
-            "tiles": pool,
+            "tiles": TilePool(frozenset(tiles), free),
         }
 
-    def _get_count(self) -> int:
-        return sum(1 for _ in self.root.rglob("*.json") if _.is_file())
+    def compact(self, tile_pool_id: str) -> bool:
+        """Apply the journal of a pool to its pool file, returning if the pool exists"""
+        filepath = self._find_first_by_id(tile_pool_id)
+        if filepath is None:
+            return False
+
+        with self._journal(filepath, exclusive=True) as journal:
+            assert journal is not None
+            if not journal.seek(0, os.SEEK_END):
+                filepath.with_suffix(self.JOURNAL_SUFFIX).unlink()
+                return True
+
+            result = self._parse(filepath, tile_pool_id, journal)
+            self._write(filepath, result)
+            # replaying a journal twice gives the same pool, so failing to remove it after
+            # the pool file was replaced is harmless
+            filepath.with_suffix(self.JOURNAL_SUFFIX).unlink()
+        return True
 
     def insert_tile_pool(self, name: str, owner: str, pool: TilePool) -> str | None:
         dir_ = self.root / owner
         dir_.mkdir(exist_ok=True)
 
         id_ = uuid.uuid4().hex
-        with open(dir_ / (id_ + ".json"), "w") as f:
-            to_write = {
-                "Owner": owner,
-                "Name": name,
-                "Tiles": [tile_to_dict(tile) for tile in pool.tiles],
-                "CreatedAt": 0,
-            }
-            if pool.free:
-                to_write["FreeTile"] = tile_to_dict(pool.free)
-            json.dump(to_write, f)
+        created_at = datetime.datetime.now().isoformat()
+        self._write(
+            dir_ / (id_ + ".json"),
+            {"id": id_, "owner": owner, "name": name, "created_at": created_at, "tiles": pool},
+        )
+
+        with self._index() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pools VALUES (?, ?, ?, ?, ?)",
+                (id_, owner, str(Path(owner) / f"{id_}.json"), name, created_at),
+            )
 
         return id_
 
@@ -82,6 +270,9 @@ class FileTilePoolDB(TilePoolDB):
             filepath = self._find_first_by_id(tile_pool_id)
             if filepath:
                 os.remove(filepath)
+                filepath.with_suffix(self.JOURNAL_SUFFIX).unlink(missing_ok=True)
+                with self._index() as conn:
+                    conn.execute("DELETE FROM pools WHERE id = ?", (tile_pool_id,))
                 return True
         except Exception as e:
             print(e)
@@ -96,6 +287,8 @@ class FileTilePoolDB(TilePoolDB):
                     filepath = dir_ / filename
                     os.remove(filepath)
             dir_.rmdir()
+            with self._index() as conn:
+                conn.execute("DELETE FROM pools WHERE owner = ?", (owner,))
             return True
         except Exception as e:
             print(e)
@@ -107,39 +300,40 @@ class FileTilePoolDB(TilePoolDB):
         removals: list[str] | None = None,
         insertions: list[Tile] | None = None,
     ) -> bool:
-        if removals is None and insertions is None:
+        if not removals and not insertions:
             return False
 
-        try:
-            result = self.get_tile_pool(tile_pool_id)
-            if result is None or (not removals and not insertions):
-                return False
-
-            if removals:
-                old_pool = result["tiles"]
-                new_tiles = frozenset(tile for tile in old_pool.tiles if tile.text not in removals)
-                result["tiles"] = TilePool(new_tiles, old_pool.free)
-
-            if insertions:
-                old_pool = result["tiles"]
-                new_pool = TilePool(frozenset(insertions))
-                result["tiles"] += new_pool
+        entry: dict = {}
+        if removals:
+            entry["remove"] = list(removals)
+        if insertions:
+            entry["insert"] = [tile_to_dict(tile) for tile in insertions]
+        line = json.dumps(entry).encode() + b"\n"
 
+        try:
             filepath = self._find_first_by_id(tile_pool_id)
             if filepath is None:
                 return False
 
-            with open(filepath, "w") as f:
-                to_write = {
-                    "Owner": result["owner"],
-                    "Name": result["name"],
-                    "Tiles": [tile_to_dict(tile) for tile in result["tiles"].tiles],
-                    "CreatedAt": result["created_at"],
-                }
-                if result["tiles"].free:
-                    to_write["FreeTile"] = tile_to_dict(result["tiles"].free)
-                json.dump(to_write, f)
-
+            with self._journal(filepath, exclusive=True) as journal:
+                assert journal is not None
+                if not filepath.is_file():
+                    filepath.with_suffix(self.JOURNAL_SUFFIX).unlink()
+                    return False
+
+                # start on a new line if the last append was cut short
+                end = journal.seek(0, os.SEEK_END)
+                if end and (journal.seek(end - 1), journal.read(1))[1] != b"\n":
+                    line = b"\n" + line
+                journal.write(line)
+                if self.fsync == "always":
+                    self._sync(journal)
+                else:
+                    journal.flush()
+                size = end + len(line)
+
+            if size >= max(self.compact_bytes, filepath.stat().st_size // 2):
+                self.compact(tile_pool_id)
             return True
 
         except Exception as e:
@@ -157,16 +351,24 @@ class FileTilePoolDB(TilePoolDB):
             print(f"Invalid quantity: {size}")
             return
 
-        count = self._get_count()
-        start, end = self.paginate(count, size, page)
+        # the page is selected from the catalog, only its pools are read from disk
+        query = "SELECT id, path FROM pools"
+        if sort != SortMethod.DEFAULT:
+            # ties are broken by id, so pages neither repeat nor skip pools
+            order = "ASC" if sort_asc else "DESC"
+            query += f" ORDER BY {sort.value} {order}, id {order}"
+        else:
+            query += " ORDER BY rowid"
+        params: tuple[int, ...] = ()
+        if size is not None:
+            query += " LIMIT ? OFFSET ?"
+            params = (size, max(0, (page - 1) * size) if page is not None else 0)
 
         try:
-            results = []
-            for filepath, tile_pool_id in self._iterate_over_pools():
-                with open(filepath) as file:
-                    results.append(self._parse(file, tile_pool_id))
+            with self._index() as conn:
+                rows = conn.execute(query, params).fetchall()
 
-            return self.sort(results, sort, sort_asc)[start:end]
+            return [self._read(self.root / path, tile_pool_id) for tile_pool_id, path in rows]
         except Exception as e:
             print("Failed to retrieve tile pools:", str(e))
             return
@@ -177,7 +379,6 @@ class FileTilePoolDB(TilePoolDB):
             if filepath is None:
                 return
 
-            with open(filepath) as file:
-                return self._parse(file, tile_pool_id)
+            return self._read(filepath, tile_pool_id)
         except Exception as e:
             print(e)
@@ -1,7 +1,10 @@
 import abc
+import base64
+import binascii
+import json
 from collections.abc import Iterable
 from enum import Enum
-from typing import TypedDict
+from typing import NotRequired, TypedDict
 
 from bingomaker.game.game import Tile, TilePool
 
@@ -30,15 +33,19 @@ class TileDict(TypedDict):
     content: str
     type: str
     tags: list[str]
+    weight: NotRequired[float]
 
 
 def tile_to_dict(tile: Tile) -> TileDict:
-    """Concert a Tile object to a Tile dict"""
-    return {
+    """Concert a Tile object to a Tile dict, leaving out the default weight"""
+    item: TileDict = {
         "content": tile.text if tile.image_url is None else tile.image_url,
         "type": TileType.TEXT.value if tile.image_url is None else TileType.IMAGE.value,
         "tags": list(tile.tags),
     }
+    if tile.weight != 1:
+        item["weight"] = tile.weight
+    return item
 
 
 def dict_to_tile(item: TileDict) -> Tile:
@@ -47,14 +54,38 @@ def dict_to_tile(item: TileDict) -> Tile:
     Raises:
         TypeError: incorrect type in dictionary
         KeyError: unable to parse item into Tile due to missing key
+        ValueError: unknown tile type or weight which is not positive
     """
     if not isinstance(item["content"], str):
         raise TypeError()
+    weight = item.get("weight", 1.0)
+    if isinstance(weight, bool) or not isinstance(weight, int | float):
+        raise TypeError()
     type_ = TileType(item["type"])
     text = item["content"]
     tags = frozenset(item["tags"])
     image_url = item["content"] if type_ == TileType.IMAGE else None
-    return Tile(text, tags, image_url)
+    return Tile(text, tags, image_url, weight)
+
+
+def encode_cursor(position: dict) -> str:
+    """Encode a position in a listing as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode a cursor created by encode_cursor
+
+    Raises:
+        ValueError: cursor is malformed
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
 
 
 class TilePoolDB(abc.ABC):
@@ -113,6 +144,38 @@ class TilePoolDB(abc.ABC):
     ) -> list[DBResult] | None:
         pass
 
+    def get_tile_pools_page(
+        self,
+        size: int,
+        cursor: str | None = None,
+        sort: SortMethod = SortMethod.DEFAULT,
+        sort_asc: bool = True,
+    ) -> tuple[list[DBResult], str | None] | None:
+        """Get a page of pools following cursor and the cursor of the next page, if any
+
+        Raises:
+            ValueError: cursor is not a cursor of this listing
+        """
+        if size < 1:
+            return
+
+        offset = 0
+        if cursor is not None:
+            position = decode_cursor(cursor)
+            offset = position.get("offset")
+            if (
+                not isinstance(offset, int)
+                or offset < 0
+                or offset % size
+                or position.get("size") != size
+            ):
+                raise ValueError("Invalid cursor")
+
+        results = self.get_tile_pools(size, offset // size + 1, sort, sort_asc) or []
+        if len(results) < size:
+            return results, None
+        return results, encode_cursor({"offset": offset + size, "size": size})
+
     @abc.abstractmethod
     def get_tile_pool(self, tile_pool_id: str) -> DBResult | None:
         pass
@@ -1,5 +1,9 @@
 import json
-from typing import Any
+import struct
+import sys
+from array import array
+from collections.abc import Iterator
+from typing import Any, TypedDict
 
 from bingomaker.game.game import Board, Tile, TilePool
 
@@ -29,3 +33,92 @@ class BoardEncoder(json.JSONEncoder):
 
             case _:
                 return super().default(o)
+
+
+class CompactCard(TypedDict):
+    version: str
+    size: int
+    indices: list[int]
+
+
+COMPACT_FORMAT = 1
+_HEADER = struct.Struct("<B4sBB")
+"""Binary card header: format, pool version, board size and bytes per tile index"""
+END_FORMAT = 0
+_END = struct.Struct("<BI")
+"""End of a stream of binary cards: format 0 and the number of cards before it"""
+
+
+def board_to_compact(pool: TilePool, board: Board) -> CompactCard:
+    """Represent a board by the version of its pool and the pool indices of its tiles
+
+    Indices refer to the pool in index order, which is the order tile pools are listed in,
+    and the free square is Board.FREE.
+    """
+    return {"version": pool.version, "size": board.size, "indices": board.indices}
+
+
+def board_to_bytes(pool: TilePool, board: Board) -> bytes:
+    """Pack a compact board into a header followed by little endian tile indices
+
+    The free square is stored as the largest index of the index width.
+    """
+    typecode, width = ("H", 2) if len(pool) < 0xFFFF else ("I", 4)
+    free = (1 << width * 8) - 1
+    indices = array(typecode, (free if i == Board.FREE else i for i in board.indices))
+    if sys.byteorder == "big":
+        indices.byteswap()
+    header = _HEADER.pack(COMPACT_FORMAT, bytes.fromhex(pool.version), board.size, width)
+    return header + indices.tobytes()
+
+
+def stream_end(count: int) -> bytes:
+    """Return the record ending a stream of count binary boards"""
+    return _END.pack(END_FORMAT, count)
+
+
+def boards_from_bytes(
+    pool: TilePool, data: bytes | memoryview, stream: bool = False
+) -> Iterator[Board]:
+    """Unpack one or more concatenated binary boards
+
+    A stream must end with the record from stream_end, so a stream which was cut short is
+    detected even when it ends between two boards.
+
+    Raises:
+        ValueError: data is malformed, truncated or was not created for this version of the
+            pool
+    """
+    data = memoryview(data)
+    version = bytes.fromhex(pool.version)
+    count = 0
+    while data:
+        if data[0] == END_FORMAT:
+            if len(data) != _END.size or _END.unpack(data)[1] != count:
+                raise ValueError("Malformed end of card stream")
+            return
+        if len(data) < _HEADER.size:
+            raise ValueError("Truncated card header")
+        format_, card_version, size, width = _HEADER.unpack_from(data)
+        if format_ != COMPACT_FORMAT or width not in (2, 4):
+            raise ValueError("Unsupported card format")
+        if card_version != version:
+            raise ValueError("Card does not belong to this version of the pool")
+
+        end = _HEADER.size + size * size * width
+        if len(data) < end:
+            raise ValueError("Truncated card indices")
+        indices = array("H" if width == 2 else "I")
+        indices.frombytes(data[_HEADER.size : end])
+        if sys.byteorder == "big":
+            indices.byteswap()
+        free = (1 << width * 8) - 1
+        if any(i >= len(pool) and i != free for i in indices):
+            raise ValueError("Card index is not in the pool")
+
+        yield Board.from_indices(pool, (Board.FREE if i == free else i for i in indices))
+        data = data[end:]
+        count += 1
+
+    if stream:
+        raise ValueError("Card stream ended early")
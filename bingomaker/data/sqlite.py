@@ -0,0 +1,196 @@
+import contextlib
+import datetime
+import json
+import sqlite3
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+
+from bingomaker.data.persistence import DBResult, SortMethod, TilePoolDB, dict_to_tile, tile_to_dict
+from bingomaker.game.game import Tile, TilePool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pools (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    free TEXT
+);
+CREATE INDEX IF NOT EXISTS pools_owner ON pools (owner);
+CREATE INDEX IF NOT EXISTS pools_name ON pools (name);
+CREATE INDEX IF NOT EXISTS pools_created_at ON pools (created_at);
+
+CREATE TABLE IF NOT EXISTS tiles (
+    pool_id TEXT NOT NULL REFERENCES pools (id) ON DELETE CASCADE,
+    text TEXT NOT NULL,
+    tile TEXT NOT NULL,
+    UNIQUE (pool_id, tile)
+);
+CREATE INDEX IF NOT EXISTS tiles_text ON tiles (pool_id, text);
+"""
+
+
+def _dump_tile(tile: Tile) -> str:
+    """Serialize a tile so that equal tiles are always the same string"""
+    item = tile_to_dict(tile)
+    item["tags"].sort()
+    return json.dumps(item, sort_keys=True)
+
+
+class SQLiteTilePoolDB(TilePoolDB):
+    """TilePools stored in a SQLite database, with a row per tile
+
+    The database runs in WAL mode, so any number of processes can read while one of them
+    writes. Tile updates only touch the rows of the changed tiles, and listings are sorted
+    and paged by SQLite.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection to the database inside of a transaction
+
+        Connections are not reused, so the database can be shared across forked workers.
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA foreign_keys = ON")
+            # WAL mode stays consistent without syncing every commit
+            conn.execute("PRAGMA synchronous = NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def insert_tile_pool(self, name: str, owner: str, pool: TilePool) -> str | None:
+        id_ = uuid.uuid4().hex
+        free = json.dumps(tile_to_dict(pool.free)) if pool.free else None
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO pools VALUES (?, ?, ?, ?, ?)",
+                    (id_, owner, name, datetime.datetime.now().isoformat(), free),
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO tiles VALUES (?, ?, ?)",
+                    ((id_, tile.text, _dump_tile(tile)) for tile in pool.tiles),
+                )
+            return id_
+        except sqlite3.Error as e:
+            print(e)
+
+    def delete_tile_pool(self, tile_pool_id: str) -> bool:
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute("DELETE FROM pools WHERE id = ?", (tile_pool_id,))
+                return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(e)
+        return False
+
+    def delete_tile_pool_by_owner(self, owner: str) -> bool:
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM pools WHERE owner = ?", (owner,))
+            return True
+        except sqlite3.Error as e:
+            print(e)
+        return False
+
+    def update_tiles(
+        self,
+        tile_pool_id: str,
+        removals: list[str] | None = None,
+        insertions: list[Tile] | None = None,
+    ) -> bool:
+        if not removals and not insertions:
+            return False
+
+        try:
+            with self._connect() as conn:
+                if conn.execute("SELECT 1 FROM pools WHERE id = ?", (tile_pool_id,)).fetchone():
+                    conn.executemany(
+                        "DELETE FROM tiles WHERE pool_id = ? AND text = ?",
+                        ((tile_pool_id, text) for text in removals or ()),
+                    )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO tiles VALUES (?, ?, ?)",
+                        ((tile_pool_id, tile.text, _dump_tile(tile)) for tile in insertions or ()),
+                    )
+                    return True
+        except sqlite3.Error as e:
+            print(e)
+        return False
+
+    def _results(self, conn: sqlite3.Connection, clauses: str, params: tuple) -> list[DBResult]:
+        """Build the pools selected by the clauses of a query on the pools table"""
+        query = "SELECT id, owner, name, created_at, free FROM pools " + clauses
+        # sqlite3 only begins transactions before writes, and both queries must read the same
+        # snapshot for the pools they select to match
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        pools = {
+            id_: (owner, name, created_at, free, set())
+            for id_, owner, name, created_at, free in conn.execute(query, params)
+        }
+        for pool_id, tile in conn.execute(
+            f"SELECT pool_id, tile FROM tiles WHERE pool_id IN (SELECT id FROM ({query}))",
+            params,
+        ):
+            pools[pool_id][4].add(dict_to_tile(json.loads(tile)))
+
+        return [
+            {
+                "id": id_,
+                "owner": owner,
+                "name": name,
+                "created_at": created_at,
+                "tiles": TilePool(
+                    frozenset(tiles), dict_to_tile(json.loads(free)) if free else None
+                ),
+            }
+            for id_, (owner, name, created_at, free, tiles) in pools.items()
+        ]
+
+    def get_tile_pools(
+        self,
+        size: int | None = None,
+        page: int | None = None,
+        sort: SortMethod = SortMethod.DEFAULT,
+        sort_asc: bool = True,
+    ) -> list[DBResult] | None:
+        if size is not None and size < 1:
+            print(f"Invalid quantity: {size}")
+            return
+
+        # the id breaks ties so pages do not overlap
+        if sort != SortMethod.DEFAULT:
+            order = "ASC" if sort_asc else "DESC"
+            clauses = f"ORDER BY {sort.value} {order}, id {order}"
+        else:
+            clauses = "ORDER BY rowid"
+        params: tuple[int, ...] = ()
+        if size is not None:
+            clauses += " LIMIT ? OFFSET ?"
+            params = (size, max(0, (page - 1) * size) if page is not None else 0)
+
+        try:
+            with self._connect() as conn:
+                return self._results(conn, clauses, params)
+        except (sqlite3.Error, ValueError, TypeError, KeyError) as e:
+            print("Failed to retrieve tile pools:", str(e))
+            return
+
+    def get_tile_pool(self, tile_pool_id: str) -> DBResult | None:
+        try:
+            with self._connect() as conn:
+                results = self._results(conn, "WHERE id = ?", (tile_pool_id,))
+            return results[0] if results else None
+        except (sqlite3.Error, ValueError, TypeError, KeyError) as e:
+            print(e)
@@ -1,3 +1,4 @@
-from bingomaker.game.game import Board, NoMatchingTile, Tile, TilePool
+from bingomaker.game.columnar import ColumnarTilePool
+from bingomaker.game.game import Board, NoMatchingTile, Tile, TilePool, generate_boards
 
-__all__ = ["Tile", "TilePool", "Board", "NoMatchingTile"]
+__all__ = ["Tile", "TilePool", "ColumnarTilePool", "Board", "NoMatchingTile", "generate_boards"]
@@ -0,0 +1,186 @@
+"""Stateless card ids
+
+A board is an ordered selection of k distinct tiles from a pool of n tiles (the free
+square is always in the middle), so the boards of a given size are in bijection with
+[0, n! / (n - k)!). Boards are ranked with a mixed radix Lehmer code over a partial
+Fisher-Yates shuffle, which ranks and unranks in O(k) without any sampling.
+
+A card id is the pool version followed by the base 62 encoding of the rank, board size
+and free square flag.
+"""
+
+import math
+from collections.abc import Iterator, Sequence
+
+from bingomaker.game.game import Board, NoMatchingTile, TilePool
+from bingomaker.game.rng import CardRandom
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+MAX_SIZE = 255
+
+
+def encode_base62(number: int) -> str:
+    if number < 0:
+        raise ValueError("Cannot encode a negative number")
+
+    digits = []
+    while True:
+        number, digit = divmod(number, 62)
+        digits.append(ALPHABET[digit])
+        if number == 0:
+            return "".join(reversed(digits))
+
+
+def decode_base62(string: str) -> int:
+    """Decode a base 62 string
+
+    Raises:
+        ValueError: string contains characters outside of the base 62 alphabet
+    """
+    if not string:
+        raise ValueError("Cannot decode an empty string")
+
+    number = 0
+    for char in string:
+        if (digit := ALPHABET.find(char)) == -1:
+            raise ValueError(f"Invalid base 62 character {char!r}")
+        number = number * 62 + digit
+    return number
+
+
+def rank_selection(n: int, selection: Sequence[int]) -> int:
+    """Rank an ordered selection of distinct integers in [0, n)
+
+    Raises:
+        ValueError: selection contains duplicates or values outside of [0, n)
+    """
+    moved: dict[int, int] = {}  # position -> value, for positions swapped away from identity
+    position: dict[int, int] = {}  # value -> position, the inverse of moved
+    digits = []
+    for i, value in enumerate(selection):
+        if not 0 <= value < n:
+            raise ValueError(f"Selection value {value} is outside of [0, {n})")
+        j = position.get(value, value)
+        if j < i:
+            raise ValueError(f"Selection value {value} is repeated")
+        digits.append(j - i)
+
+        # swap positions i and j, position i is never looked at again
+        displaced = moved.get(i, i)
+        moved[j] = displaced
+        position[displaced] = j
+        position[value] = i
+
+    rank = 0
+    for i in reversed(range(len(digits))):
+        rank = rank * (n - i) + digits[i]
+    return rank
+
+
+def unrank_selection(n: int, k: int, rank: int) -> list[int]:
+    """Return the ordered selection of k distinct integers in [0, n) with the given rank
+
+    Raises:
+        ValueError: rank is outside of [0, n! / (n - k)!)
+    """
+    if not 0 <= rank < math.perm(n, k):
+        raise ValueError("Rank is out of range")
+
+    moved: dict[int, int] = {}
+    selection = []
+    for i in range(k):
+        rank, digit = divmod(rank, n - i)
+        j = i + digit
+        selection.append(moved.get(j, j))
+        moved[j] = moved.get(i, i)
+    return selection
+
+
+def rank_board(pool: TilePool, board: Board) -> int:
+    """Return the number of a board, combining its rank, size and free square"""
+    if board.size > MAX_SIZE:
+        raise ValueError(f"Boards larger than {MAX_SIZE} cannot be ranked")
+
+    free_square = Board.FREE in board.indices
+    selection = [i for i in board.indices if i != Board.FREE]
+    if free_square and board.indices[board.size // 2 * board.size + board.size // 2] != Board.FREE:
+        raise ValueError("Free square is not in the middle of the board")
+
+    rank = rank_selection(len(pool), selection)
+    return (rank * (MAX_SIZE + 1) + board.size) * 2 + free_square
+
+
+def unrank_board(pool: TilePool, number: int) -> Board:
+    """Create the board with the given number
+
+    Raises:
+        ValueError: the number does not identify a board of the pool
+        NoMatchingTile: the board needs a free square and the pool has none
+    """
+    rest, free_square = divmod(number, 2)
+    rank, size = divmod(rest, MAX_SIZE + 1)
+
+    cells = size * size - free_square
+    if cells < 0:
+        raise ValueError("Invalid board size")
+    indices = unrank_selection(len(pool), cells, rank)
+    if free_square:
+        indices.insert(size // 2 * size + size // 2, Board.FREE)
+    return Board.from_indices(pool, indices)
+
+
+def card_id(pool: TilePool, board: Board) -> str:
+    """Return the card id of a board drawn from pool"""
+    return f"{pool.version}-{encode_base62(rank_board(pool, board))}"
+
+
+def decode_card_id(pool: TilePool, id_: str) -> Board:
+    """Recreate the board identified by a card id
+
+    Raises:
+        ValueError: the card id is malformed or was not created for this version of the pool
+        NoMatchingTile: the board needs a free square and the pool has none
+    """
+    version, _, number = id_.partition("-")
+    if version != pool.version:
+        raise ValueError("Card id does not belong to this version of the pool")
+
+    board = unrank_board(pool, decode_base62(number))
+    board.id = id_
+    return board
+
+
+def distinct_boards(
+    pool: TilePool,
+    count: int,
+    size: int = 5,
+    free_square: bool = True,
+    seed: int = 0,
+) -> Iterator[Board]:
+    """Lazily generate count boards which are guaranteed to be distinct
+
+    Boards are taken at ranks start, start + stride, ... modulo the number of possible
+    boards, with a stride coprime to that number, so no rank repeats.
+
+    Raises:
+        NoMatchingTile: the pool cannot produce count distinct boards
+    """
+    if free_square:
+        pool.get_free()
+    total = math.perm(len(pool), size * size - free_square)
+    if count > total:
+        raise NoMatchingTile(f"Pool can only produce {total} distinct boards")
+
+    rng = CardRandom(seed)
+    start = rng.randrange(total)
+    stride = 1
+    if total > 2:
+        stride = rng.randrange(1, total)
+        while math.gcd(stride, total) != 1:
+            stride = rng.randrange(1, total)
+
+    for i in range(count):
+        rank = (start + i * stride) % total
+        board = unrank_board(pool, (rank * (MAX_SIZE + 1) + size) * 2 + free_square)
+        board.id = card_id(pool, board)
+        yield board
@@ -0,0 +1,131 @@
+"""Card sets with uniqueness guarantees for print runs
+
+Cards are deduplicated with Bloom filters. A false positive only ever rejects a card that
+was actually acceptable, so no accepted card can violate a constraint, while memory stays
+bounded by the filter size instead of growing with every stored card.
+"""
+
+import itertools
+import math
+from collections.abc import Hashable, Iterable, Iterator
+
+from bingomaker.game.game import Board, NoMatchingTile, TilePool
+from bingomaker.game.rng import MASK64, CardRandom, mix64
+
+MAX_SUBSETS_PER_CARD = 5_000
+MAX_FILTER_BYTES = 32 * 1024 * 1024
+
+
+class BloomFilter:
+    """A Bloom filter over hashable keys using double hashing"""
+
+    def __init__(self, capacity: int, error_rate: float = 1e-3):
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate in (0, 1)")
+
+        self.size = BloomFilter.bits(capacity, error_rate)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    @staticmethod
+    def bits(capacity: int, error_rate: float = 1e-3) -> int:
+        """Return the number of bits in a filter for capacity keys"""
+        return max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+
+    def _positions(self, key: Hashable) -> Iterator[int]:
+        h = hash(key) & MASK64
+        h1, h2 = mix64(h), mix64(h ^ 0x5BD1E9955BD1E995) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def __contains__(self, key: Hashable) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key: Hashable) -> bool:
+        """Add a key, returning if the key may have already been present"""
+        present = True
+        for pos in self._positions(key):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            if not self._bits[byte] & bit:
+                present = False
+                self._bits[byte] |= bit
+        return present
+
+
+def generate_card_set(
+    pool: TilePool,
+    count: int,
+    size: int = 5,
+    free_square: bool = True,
+    seed: int = 0,
+    max_overlap: int | None = None,
+    exclude_tags: Iterable[str] | None = None,
+    error_rate: float = 1e-3,
+    max_attempts: int = 1_000,
+) -> Iterator[Board]:
+    """Lazily generate count distinct boards
+
+    No two boards have the same tiles in the same cells. With max_overlap, no two boards
+    share more than max_overlap tiles in any cells, which is enforced by remembering every
+    (max_overlap + 1) subset of tiles of each accepted board, so it is intended for small
+    overlaps or for overlaps close to the number of cells (preventing near duplicates).
+
+    Each board keeps the seed it was drawn with, so boards can be regenerated with Board.
+
+    Raises:
+        ValueError: max_overlap is negative or would require too many subsets per board, or
+            the filters for count boards would take more than MAX_FILTER_BYTES
+        NoMatchingTile: no acceptable board was found within max_attempts draws
+    """
+    cells = size * size - free_square
+    exclude_tags = None if exclude_tags is None else frozenset(exclude_tags)
+
+    if max_overlap is not None and max_overlap < 0:
+        raise ValueError(f"max_overlap must not be negative, got {max_overlap}")
+
+    subsets = 0
+    if max_overlap is not None and max_overlap < cells:
+        subsets = math.comb(cells, max_overlap + 1)
+        if subsets > MAX_SUBSETS_PER_CARD:
+            raise ValueError(
+                f"max_overlap of {max_overlap} needs {subsets} subsets per board, "
+                f"at most {MAX_SUBSETS_PER_CARD} are supported"
+            )
+
+    entries = count + count * subsets
+    if (BloomFilter.bits(entries, error_rate) + 7) // 8 > MAX_FILTER_BYTES:
+        raise ValueError(
+            f"{count} boards with {subsets} subsets each need {entries} filter entries, "
+            f"at most {MAX_FILTER_BYTES * 8 // BloomFilter.bits(1, error_rate)} are supported"
+        )
+
+    boards = BloomFilter(count, error_rate)
+    overlaps = BloomFilter(count * subsets, error_rate) if subsets else None
+    rng = CardRandom(seed)
+
+    for _ in range(count):
+        for _ in range(max_attempts):
+            board = Board(
+                pool,
+                size=size,
+                free_square=free_square,
+                seed=rng.getrandbits(64),
+                exclude_tags=exclude_tags,
+            )
+            if tuple(board.indices) in boards:
+                continue
+
+            if overlaps is not None:
+                tiles = sorted(i for i in board.indices if i != Board.FREE)
+                keys = list(itertools.combinations(tiles, max_overlap + 1))
+                if any(key in overlaps for key in keys):
+                    continue
+                for key in keys:
+                    overlaps.add(key)
+
+            boards.add(tuple(board.indices))
+            board.id = str(board.seed)
+            yield board
+            break
+        else:
+            raise NoMatchingTile(f"Unable to find a unique board after {max_attempts} attempts")
@@ -0,0 +1,119 @@
+import random
+import weakref
+from array import array
+from collections.abc import Iterable, Iterator, MutableSequence
+
+from bingomaker.game.game import Tile, TilePool, _tile_sort_key
+
+
+class ColumnarTilePool(TilePool):
+    """A TilePool stored column-wise in flat buffers instead of as Tile objects
+
+    Tile texts are kept in a single string table with offsets, image urls in a sparse
+    column and tags as integer ids. Tiles are only created when they are accessed,
+    which makes long lived pools several times smaller than an equivalent TilePool.
+
+    TilePool.__init__ is not called, since it would index every tile as a Tile object.
+    Combining pools with + and - gives another ColumnarTilePool.
+    """
+
+    def __init__(
+        self,
+        tiles: Iterable[Tile],
+        free_square: Tile | None = None,
+    ):
+        self.free = free_square
+        self._random = random.Random()
+        self._tiles: weakref.ref[frozenset[Tile]] | None = None
+
+        texts: list[str] = []
+        self._offsets = array("I", [0])
+        self._images: dict[int, str] = {}
+        self._tag_names: list[str] = []
+        self._tag_offsets = array("I", [0])
+        self._tag_ids = array("I")
+        weights = array("d")
+
+        self._tag_bits: dict[str, int] = {}
+        tag_index: dict[str, list[int]] = {}
+        masks: list[int] = []
+
+        length = 0
+        for i, tile in enumerate(sorted(tiles, key=_tile_sort_key)):
+            texts.append(tile.text)
+            length += len(tile.text)
+            self._offsets.append(length)
+            if tile.image_url is not None:
+                self._images[i] = tile.image_url
+            weights.append(tile.weight)
+
+            mask = 0
+            for tag in sorted(tile.tags):
+                if tag not in self._tag_bits:
+                    self._tag_bits[tag] = 1 << len(self._tag_names)
+                    self._tag_names.append(tag)
+                bit = self._tag_bits[tag]
+                self._tag_ids.append(bit.bit_length() - 1)
+                tag_index.setdefault(tag, []).append(i)
+                mask |= bit
+            self._tag_offsets.append(len(self._tag_ids))
+            masks.append(mask)
+
+        self._text = "".join(texts)
+        self._tag_index = {tag: array("I", indices) for tag, indices in tag_index.items()}
+        self._masks: MutableSequence[int] = (
+            array("Q", masks) if len(self._tag_names) <= 64 else masks
+        )
+        self._weights = weights if any(weight != 1 for weight in weights) else None
+
+    @classmethod
+    def from_pool(cls, pool: TilePool) -> "ColumnarTilePool":
+        return cls(pool, pool.free)
+
+    @property
+    def tiles(self) -> frozenset[Tile]:
+        """All tiles of the pool
+
+        The set is only cached while it is still referenced elsewhere, holding on to it
+        would keep every tile alive and undo the savings of the columns.
+        """
+        if self._tiles is None or (tiles := self._tiles()) is None:
+            tiles = frozenset(self)
+            self._tiles = weakref.ref(tiles)
+        return tiles
+
+    def __getstate__(self):
+        # pools are pickled to render workers, which rebuild the set of tiles if needed
+        return self.__dict__ | {"_tiles": None}
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> Tile:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("tile index out of range")
+
+        tag_start, tag_end = self._tag_offsets[index], self._tag_offsets[index + 1]
+        return Tile(
+            self._text_at(index),
+            frozenset(self._tag_names[id_] for id_ in self._tag_ids[tag_start:tag_end]),
+            self._images.get(index),
+            self._weights[index] if self._weights is not None else 1.0,
+        )
+
+    def __iter__(self) -> Iterator[Tile]:
+        return (self[i] for i in range(len(self)))
+
+    def __contains__(self, tile: Tile):
+        if tile == self.free:
+            return True
+        try:
+            self.index(tile)
+        except ValueError:
+            return False
+        return True
+
+    def _text_at(self, index: int) -> str:
+        return self._text[self._offsets[index] : self._offsets[index + 1]]
@@ -1,24 +1,72 @@
+import bisect
+import functools
+import hashlib
+import heapq
+import math
 import random
-from collections.abc import Iterable
+import sys
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+
+from bingomaker.game.rng import MASK64, card_random
 
 
 class NoMatchingTile(Exception):
     pass
 
 
+_INTERNED_TAGS: dict[frozenset[str], frozenset[str]] = {}
+_MAX_INTERNED_TAGS = 1 << 16
+_MAX_EXCLUSIONS = 64
+
+
+def _intern_tags(tags: frozenset[str]) -> frozenset[str]:
+    """Return a shared instance of an equal tag set, so repeated tag sets are stored once"""
+    if (interned := _INTERNED_TAGS.get(tags)) is not None:
+        return interned
+
+    if len(_INTERNED_TAGS) >= _MAX_INTERNED_TAGS:
+        _INTERNED_TAGS.clear()
+    interned = frozenset(map(sys.intern, tags))
+    _INTERNED_TAGS[interned] = interned
+    return interned
+
+
 class Tile:
+    """An immutable bingo tile
+
+    Tiles are hashed constantly while inside of pools, so the hash is computed once.
+    The weight of a tile is its relative chance of being drawn compared to other tiles.
+    """
+
+    __slots__ = ("text", "tags", "image_url", "weight", "_hash")
+
     def __init__(
         self,
         text: str,
         tags: frozenset[str] = frozenset(),
         image_url: str | None = None,
+        weight: float = 1.0,
     ):
-        self.text = text
-        self.tags = tags
+        """
+        Raises:
+            ValueError: weight is not a positive finite number
+        """
+        if not 0 < weight < math.inf:
+            raise ValueError(f"Tile weight must be positive, got {weight}")
+
+        self.text = sys.intern(text)
+        self.tags = _intern_tags(tags if isinstance(tags, frozenset) else frozenset(tags))
         self.image_url = image_url
+        self.weight = weight
+        self._hash = hash((self.text, self.tags, self.image_url))
 
     def __hash__(self):
-        return hash((self.text, self.tags, self.image_url))
+        return self._hash
+
+    def __reduce__(self):
+        # the cached hash is only valid in this process, so pickles rebuild the tile
+        return (Tile, (self.text, self.tags, self.image_url, self.weight))
 
     def __str__(self):
         s = self.text
@@ -29,20 +77,23 @@ class Tile:
         return s
 
     def __repr__(self):
-        return f"Tile(text={self.text}, image_url={self.image_url}, tags={self.tags})"
+        weight = f", weight={self.weight}" if self.weight != 1 else ""
+        return f"Tile(text={self.text}, image_url={self.image_url}, tags={self.tags}{weight})"
 
     def __eq__(self, other):
+        if self is other:
+            return True
         # NOTE: because of how the tests import this module,
         #       it is easiest to just check for an exception
         try:
-            return all(
-                (
-                    self.text == other.text,
-                    self.tags == other.tags,
-                    self.image_url == other.image_url,
-                )
+            return (
+                self._hash == other._hash
+                and self.text == other.text
+                and self.image_url == other.image_url
+                and self.tags == other.tags
+                and self.weight == other.weight
             )
-        except Exception:
+        except AttributeError:
             return False
 
 
@@ -56,18 +107,65 @@ class TilePool:
         self.free = free_square
         self._random = random.Random()
 
+        # tiles are indexed in a stable order so that seeded draws are reproducible
+        self._indexed: tuple[Tile, ...] = tuple(sorted(tiles, key=_tile_sort_key))
+        self._tag_index: dict[str, list[int]] = {}
+        self._tag_bits: dict[str, int] = {}
+        self._masks: list[int] = []
+        for i, tile in enumerate(self._indexed):
+            mask = 0
+            for tag in tile.tags:
+                self._tag_index.setdefault(tag, []).append(i)
+                bit = self._tag_bits.setdefault(tag, 1 << len(self._tag_bits))
+                mask |= bit
+            self._masks.append(mask)
+
+        weights = [tile.weight for tile in self._indexed]
+        self._weights: Sequence[float] | None = (
+            weights if any(weight != 1 for weight in weights) else None
+        )
+
     def __len__(self):
-        return len(self.tiles)
+        return len(self._indexed)
+
+    @functools.cached_property
+    def version(self) -> str:
+        """A fingerprint of the pool contents, changing whenever a tile is added or removed"""
+        tiles = (*self, self.free) if self.free is not None else self
+        contents = "\x1e".join(
+            "\x1f".join((tile.text, tile.image_url or "", *sorted(tile.tags)))
+            + (f"\x1d{tile.weight!r}" if tile.weight != 1 else "")
+            for tile in tiles
+        )
+        return hashlib.blake2b(contents.encode(), digest_size=4).hexdigest()
+
+    def __getitem__(self, index: int) -> Tile:
+        return self._indexed[index]
+
+    def __iter__(self) -> Iterator[Tile]:
+        return iter(self._indexed)
 
     def __sub__(self, other):
-        return TilePool(self.tiles - other.tiles, self.free)
+        return type(self)(self.tiles - other.tiles, self.free)
 
     def __add__(self, other):
-        return TilePool(self.tiles | other.tiles, self.free)
+        return type(self)(self.tiles | other.tiles, self.free)
 
     def __contains__(self, tile: Tile):
         return tile in self.tiles or tile == self.free
 
+    def index(self, tile: Tile) -> int:
+        """Return the index of a tile in the pool
+
+        Raises:
+            ValueError: tile is not in the pool
+        """
+        # tiles are indexed in sorted order, so they can be found with a binary search
+        i = bisect.bisect_left(self, _tile_sort_key(tile), key=_tile_sort_key)
+        if i == len(self) or self[i] != tile:
+            raise ValueError(f"{tile!r} is not in pool")
+        return i
+
     def __str__(self):
         tiles = ", ".join(map(lambda tile: str(tile), self.tiles))
         s = f"[ {tiles} ]"
@@ -75,9 +173,43 @@ class TilePool:
             s += f" : {str(self.free)}"
         return s
 
+    def _tag_mask(self, tags: Iterable[str] | None) -> int:
+        """Return the bitmask of the given tags, ignoring tags not found in the pool"""
+        mask = 0
+        if tags is not None:
+            for tag in tags:
+                mask |= self._tag_bits.get(tag, 0)
+        return mask
+
+    @functools.cached_property
+    def _exclusions(self) -> dict[frozenset[str], tuple[int, Sequence[int]]]:
+        return {}
+
+    def _allowed(self, exclude_tags: Iterable[str] | None) -> tuple[int, Sequence[int]]:
+        """Return the mask of the excluded tags and the indices of tiles without any of them
+
+        Results are cached per set of excluded tags, so drawing many boards with the same
+        exclusions only filters the pool once instead of once per board.
+        """
+        key = frozenset(tag for tag in exclude_tags or () if tag in self._tag_bits)
+        if (cached := self._exclusions.get(key)) is not None:
+            return cached
+
+        mask = self._tag_mask(key)
+        if not key:
+            allowed: Sequence[int] = range(len(self))
+        else:
+            excluded = set().union(*(self._tag_index[tag] for tag in key))
+            allowed = array("I", (i for i in range(len(self)) if i not in excluded))
+
+        if len(self._exclusions) >= _MAX_EXCLUSIONS:
+            self._exclusions.clear()
+        self._exclusions[key] = mask, allowed
+        return mask, allowed
+
     def _filter_by_tags(self, exclude_tags: list[str]) -> Iterable[Tile]:
         """Return an iterable over tiles which do not container any excluded tags"""
-        return filter(lambda tile: len(tile.tags.intersection(exclude_tags)) == 0, self.tiles)
+        return (self[i] for i in self._allowed(exclude_tags)[1])
 
     def get_free(self) -> Tile:
         if self.free is None:
@@ -85,39 +217,205 @@ class TilePool:
 
         return self.free
 
+    def sample_indices(
+        self,
+        k: int,
+        exclude_tags: Iterable[str] | None = None,
+        rng: random.Random | None = None,
+    ) -> list[int]:
+        """Draw k distinct tile indices without replacement, skipping excluded tags
+
+        Indices are distinct, not texts: tiles sharing a text but differing in tags, image
+        or weight may both be drawn.
+
+        Raises:
+            NoMatchingTile: fewer than k tiles remain after exclusion
+        """
+        rng = self._random if rng is None else rng
+        n = len(self)
+        mask, allowed = self._allowed(exclude_tags)
+        excluded = n - len(allowed)
+        if k > len(allowed):
+            raise NoMatchingTile(
+                f"Not enough tiles in pool: {k} needed, {len(allowed)} available"
+                + (f" after excluding {excluded} tagged tiles" if excluded else "")
+            )
+
+        if self._weights is not None:
+            return self._sample_weighted(k, mask, rng)
+        if not excluded:
+            return rng.sample(range(n), k)
+
+        masks = self._masks
+
+        # rejection sampling stays O(k) while most of the pool is still available
+        if k + excluded <= n // 2:
+            chosen: list[int] = []
+            seen: set[int] = set()
+            while len(chosen) < k:
+                i = rng.randrange(n)
+                if not masks[i] & mask and i not in seen:
+                    seen.add(i)
+                    chosen.append(i)
+            return chosen
+
+        return rng.sample(allowed, k)
+
+    @functools.cached_property
+    def _alias(self) -> tuple[list[float], list[int]]:
+        """Walker alias table of the tile weights
+
+        Index i is kept with probability prob[i] and otherwise replaced by alias[i], so a
+        weighted draw takes a single random number regardless of the size of the pool.
+        """
+        n = len(self)
+        weights = self._weights or [1.0] * n
+        total = math.fsum(weights)
+        prob = [weight * n / total for weight in weights]
+        alias = list(range(n))
+        small = [i for i, p in enumerate(prob) if p < 1]
+        large = [i for i, p in enumerate(prob) if p >= 1]
+        while small and large:
+            i, j = small.pop(), large[-1]
+            alias[i] = j
+            prob[j] -= 1 - prob[i]
+            if prob[j] < 1:
+                small.append(large.pop())
+        # whatever is left over is only off by rounding errors
+        for i in small + large:
+            prob[i] = 1.0
+        return prob, alias
+
+    def _sample_weighted(self, k: int, mask: int, rng: random.Random) -> list[int]:
+        """Draw k distinct indices without replacement, proportionally to the tile weights
+
+        Tiles which are excluded or already drawn are rejected, which keeps each draw O(1)
+        while most of the weight is still available. Once rejections start to dominate, the
+        remaining tiles are drawn at once with exponential keys in a single O(n) pass.
+        """
+        prob, alias = self._alias
+        masks = self._masks
+        n = len(self)
+
+        chosen: list[int] = []
+        seen: set[int] = set()
+        attempts = 4 * k + 16
+        while len(chosen) < k and attempts:
+            attempts -= 1
+            u = rng.random() * n
+            i = int(u)
+            if u - i >= prob[i]:
+                i = alias[i]
+            if not masks[i] & mask and i not in seen:
+                seen.add(i)
+                chosen.append(i)
+
+        if len(chosen) < k:
+            weights = self._weights or [1.0] * n
+            keys = (
+                (rng.expovariate(weights[i]), i)
+                for i in range(n)
+                if not masks[i] & mask and i not in seen
+            )
+            chosen.extend(i for _, i in heapq.nsmallest(k - len(chosen), keys))
+        return chosen
+
+    def sample(
+        self, k: int, exclude_tags: Iterable[str] | None = None, seed: None | int = None
+    ) -> list[Tile]:
+        """Draw k distinct tiles from the tile pool"""
+        rng = self._random if seed is None else card_random(seed)
+        return [self[i] for i in self.sample_indices(k, exclude_tags, rng)]
+
     def get_tile(self, exclude_tags: list[str] | None = None, seed: None | int = None) -> Tile:
         """Get a tile from the tile pool"""
-        tiles = self.tiles if exclude_tags is None else self._filter_by_tags(exclude_tags)
-        try:
-            self._random.seed(seed)
-            tile = self._random.choice(tuple(tiles))
-        except IndexError as e:
-            raise NoMatchingTile("No more valid tiles in pool") from e
+        return self.sample(1, exclude_tags, seed)[0]
 
-        return tile
+
+def _tile_sort_key(tile: Tile) -> tuple[str, str, list[str], float]:
+    return tile.text, tile.image_url or "", sorted(tile.tags), tile.weight
 
 
 class Board:
+    FREE = -1
+    """Index used in Board.indices for the free square"""
+
     def __init__(
         self,
         pool: TilePool,
         size: int = 5,
         free_square: bool = True,
         seed: int = 0,
+        exclude_tags: Iterable[str] | None = None,
+        compat: bool = False,
     ):
+        """Draw a size x size board from pool
+
+        Every cell holds a different tile of the pool, though two tiles with the same text
+        and different tags, image or weight can both be on the board.
+
+        seed is a 64 bit integer; compat draws the board with the Mersenne Twister sampler
+        used before 64 bit seeds, see card_random
+        """
         self.board: list[list[Tile]] = []
         self.size = size
         self.seed = seed
+        self.compat = compat
         self.id = ""
 
-        used = []
-        for x in range(size):
-            self.board.append([])
-            for y in range(size):
-                new_tile = pool.get_tile(seed=self.seed * x + y, exclude_tags=used)
-                self.board[x].append(new_tile)
-                used.append(new_tile.text)
-
-        if free_square:
-            mid = size // 2
-            self.board[mid][mid] = pool.get_free()
+        free = pool.get_free() if free_square else None
+
+        # draw every cell in a single pass, leaving a gap for the free square
+        cells = size * size - (free is not None)
+        self.indices = pool.sample_indices(cells, exclude_tags, card_random(seed, compat))
+        if free is not None:
+            self.indices.insert(size // 2 * size + size // 2, Board.FREE)
+
+        self._layout(pool)
+
+    @classmethod
+    def from_indices(cls, pool: TilePool, indices: Iterable[int], seed: int = 0) -> "Board":
+        """Create a board from row major pool indices, using Board.FREE for the free square
+
+        Raises:
+            ValueError: indices do not form a square board
+        """
+        board = cls.__new__(cls)
+        board.indices = list(indices)
+        board.size = math.isqrt(len(board.indices))
+        if board.size * board.size != len(board.indices):
+            raise ValueError("Board indices are not square")
+        board.board = []
+        board.seed = seed
+        board.compat = False
+        board.id = ""
+        board._layout(pool)
+        return board
+
+    def _layout(self, pool: TilePool):
+        free = pool.get_free() if Board.FREE in self.indices else None
+        for x in range(self.size):
+            row = self.indices[x * self.size : (x + 1) * self.size]
+            self.board.append([pool[i] if i != Board.FREE else free for i in row])
+
+
+def generate_boards(
+    pool: TilePool,
+    count: int,
+    size: int = 5,
+    free_square: bool = True,
+    seed: int = 0,
+    exclude_tags: Iterable[str] | None = None,
+    compat: bool = False,
+) -> Iterator[Board]:
+    """Lazily generate count boards from a single pool, seeded by seed, seed + 1, ..."""
+    exclude_tags = None if exclude_tags is None else frozenset(exclude_tags)
+    for i in range(count):
+        yield Board(
+            pool,
+            size=size,
+            free_square=free_square,
+            seed=(seed + i) & MASK64,
+            exclude_tags=exclude_tags,
+            compat=compat,
+        )
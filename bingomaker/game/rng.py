@@ -0,0 +1,88 @@
+import os
+import random
+
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+
+def mix64(z: int) -> int:
+    """SplitMix64 finalizer, a bijection on 64 bit integers with strong avalanche"""
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+class CardRandom(random.Random):
+    """A counter-based 64 bit generator for bingo cards
+
+    Output n of the generator is mix64(key + n * GOLDEN_GAMMA) where key is the mixed seed,
+    so seeding is O(1), any seed in [0, 2**64) gives its own stream, and nearby seeds give
+    statistically independent streams. Independent child streams, e.g. one per cell or
+    per worker, are derived with spawn.
+
+    All of the random.Random methods (sample, randrange, shuffle, ...) are available.
+    """
+
+    def __init__(self, seed: int | None = None):
+        super().__init__(seed)
+
+    def seed(self, a: int | None = None, version: int = 2):
+        if a is None:
+            a = int.from_bytes(os.urandom(8))
+        if not isinstance(a, int):
+            raise TypeError("CardRandom can only be seeded with an integer")
+        self._key = mix64(a & MASK64)
+        self._counter = 0
+        self.gauss_next = None
+
+    def _next64(self) -> int:
+        self._counter += 1
+        return mix64((self._key + self._counter * GOLDEN_GAMMA) & MASK64)
+
+    def _randbelow(self, n: int) -> int:
+        """Return a uniform integer in [0, n) using Lemire's multiply and shift method"""
+        if not 0 < n <= 1 << 64:
+            return super()._randbelow(n)
+
+        threshold = (1 << 64) % n
+        while True:
+            self._counter += 1
+            product = mix64((self._key + self._counter * GOLDEN_GAMMA) & MASK64) * n
+            if product & MASK64 >= threshold:
+                return product >> 64
+
+    def getrandbits(self, k: int) -> int:
+        if k <= 64:
+            return self._next64() >> (64 - k)
+
+        bits = 0
+        for _ in range((k + 63) // 64):
+            bits = (bits << 64) | self._next64()
+        return bits >> (-k % 64)
+
+    def random(self) -> float:
+        return (self._next64() >> 11) * (1.0 / (1 << 53))
+
+    def getstate(self) -> tuple[int, int]:
+        return self._key, self._counter
+
+    def setstate(self, state: tuple[int, int]):
+        self._key, self._counter = state
+
+    def spawn(self, stream: int) -> "CardRandom":
+        """Return an independent generator for the given stream number"""
+        child = CardRandom(0)
+        child._key = mix64(self._key ^ mix64((stream + 1) * GOLDEN_GAMMA & MASK64))
+        return child
+
+
+def card_random(seed: int | None = None, compat: bool = False) -> random.Random:
+    """Return the generator used to draw a card
+
+    Compatibility mode uses a Mersenne Twister seeded with seed, the sampler used before
+    CardRandom was introduced. It does not reproduce cards of the original per-cell
+    generator, which drew from the iteration order of a frozenset. That order depends on
+    string hashes, which are randomized in every process, so those cards cannot be
+    recreated.
+    """
+    return random.Random(seed) if compat else CardRandom(seed)
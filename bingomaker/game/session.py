@@ -0,0 +1,156 @@
+"""Server side bingo games
+
+Every registered board is tracked as a bitboard of marked cells, bit x * size + y for the
+cell in row x and column y. Winning lines are precomputed masks, so checking a board
+after a call only tests the few lines through the marked cell.
+"""
+
+import functools
+from array import array
+
+from bingomaker.game.cardid import card_id
+from bingomaker.game.game import Board, Tile, TilePool
+from bingomaker.game.rng import CardRandom
+
+
+@functools.cache
+def line_masks(size: int) -> tuple[int, ...]:
+    """Return the masks of every row, column and diagonal of a board"""
+    row = (1 << size) - 1
+    rows = [row << (x * size) for x in range(size)]
+    cols = [sum(1 << (x * size + y) for x in range(size)) for y in range(size)]
+    diagonal = sum(1 << (i * size + i) for i in range(size))
+    anti_diagonal = sum(1 << (i * size + size - 1 - i) for i in range(size))
+    return (*rows, *cols, diagonal, anti_diagonal)
+
+
+@functools.cache
+def cell_lines(size: int) -> tuple[tuple[int, ...], ...]:
+    """Return the masks of the lines going through each cell of a board"""
+    lines = line_masks(size)
+    return tuple(tuple(mask for mask in lines if mask >> cell & 1) for cell in range(size * size))
+
+
+def has_line(marks: int, size: int) -> bool:
+    return any(marks & mask == mask for mask in line_masks(size))
+
+
+class Card:
+    """A board registered in a game"""
+
+    __slots__ = ("id", "board", "lines", "marks")
+
+    def __init__(self, id_: str, board: Board):
+        self.id = id_
+        self.board = board
+        self.lines = cell_lines(board.size)
+        self.marks = 0
+
+    def mark(self, cell: int) -> bool:
+        """Mark a cell, returning if it completes a line"""
+        marks = self.marks = self.marks | 1 << cell
+        return any(marks & mask == mask for mask in self.lines[cell])
+
+
+class GameSession:
+    """A game in which tiles are called from a pool and registered boards are marked
+
+    The session keeps an inverted index from each tile to the cells holding it, so a call
+    only touches the boards containing the called tile.
+    """
+
+    def __init__(self, pool: TilePool, seed: int | None = None):
+        self.pool = pool
+        self.calls: list[int] = []
+        self.cards: dict[str, Card] = {}
+        self.winners: dict[str, int] = {}
+        """Card ids of winning boards and the number of calls it took them to win"""
+        self._called: set[int] = set()
+        self._rng = CardRandom(seed)
+
+        # pool index -> (card number << 16 | cell) of every cell holding the tile
+        self._numbered: list[Card] = []
+        self._holders: dict[int, array[int]] = {}
+
+    def register(self, board: Board, id_: str | None = None) -> str:
+        """Register a board drawn from the pool, returning the card id used to refer to it
+
+        Tiles called before the board is registered are marked immediately.
+
+        Raises:
+            ValueError: a board is already registered with the card id
+        """
+        id_ = id_ or board.id or card_id(self.pool, board)
+        if id_ in self.cards:
+            raise ValueError(f"Card {id_} is already registered")
+
+        card = self.cards[id_] = Card(id_, board)
+        number = len(self._numbered) << 16
+        self._numbered.append(card)
+        for cell, index in enumerate(board.indices):
+            if index == Board.FREE or index in self._called:
+                card.mark(cell)
+            else:
+                if (holders := self._holders.get(index)) is None:
+                    holders = self._holders[index] = array("Q")
+                holders.append(number | cell)
+
+        if has_line(card.marks, board.size):
+            self.winners[id_] = len(self.calls)
+        return id_
+
+    def call(self, tile: Tile | int) -> list[str]:
+        """Call a tile or pool index, returning the card ids of boards which won by it
+
+        Raises:
+            ValueError: tile is not in the pool or has already been called
+        """
+        index = tile if isinstance(tile, int) else self.pool.index(tile)
+        if not 0 <= index < len(self.pool):
+            raise ValueError(f"Tile index {index} is not in pool")
+        if index in self._called:
+            raise ValueError(f"{self.pool[index]!r} has already been called")
+
+        self._called.add(index)
+        self.calls.append(index)
+
+        # a called tile is never called again, so its holders are no longer needed
+        winners = []
+        cards = self._numbered
+        for holder in self._holders.pop(index, ()):
+            card = cards[holder >> 16]
+            cell = holder & 0xFFFF
+            marks = card.marks = card.marks | 1 << cell
+            for mask in card.lines[cell]:
+                if marks & mask == mask:
+                    if card.id not in self.winners:
+                        self.winners[card.id] = len(self.calls)
+                        winners.append(card.id)
+                    break
+        return winners
+
+    def draw(self) -> tuple[Tile, list[str]]:
+        """Call a random tile which has not been called yet
+
+        Raises:
+            IndexError: every tile has been called
+        """
+        remaining = len(self.pool) - len(self.calls)
+        if remaining == 0:
+            raise IndexError("Every tile has been called")
+
+        if remaining * 2 < len(self.pool):
+            index = self._rng.choice([i for i in range(len(self.pool)) if i not in self._called])
+        else:
+            while (index := self._rng.randrange(len(self.pool))) in self._called:
+                pass
+        return self.pool[index], self.call(index)
+
+    def verify(self, id_: str) -> bool:
+        """Return if a registered board has a complete line
+
+        Raises:
+            KeyError: no board is registered with the card id
+        """
+        card = self.cards[id_]
+        return has_line(card.marks, card.board.size)
@@ -0,0 +1,171 @@
+"""Monte Carlo simulation of bingo games for tuning pools
+
+The call order of a game is a uniformly random permutation of the pool which is independent
+of the boards, so the call numbers of a board's cells are distributed exactly like a uniform
+sample of pool indices. Boards are therefore drawn directly in call number space, and a
+board wins on the call completing its first line: the minimum over its lines of the latest
+call in the line. This replaces marking every board on every call with a handful of
+max/min operations per board.
+
+Usage: python -m bingomaker.game.simulation POOL_SIZE [options]
+"""
+
+import argparse
+import os
+import random
+from collections import Counter
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from typing import TypedDict
+
+from bingomaker.game.game import Tile, TilePool
+from bingomaker.game.rng import CardRandom
+from bingomaker.game.session import line_masks
+
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+CHUNKS = 64
+
+
+class SimulationReport(TypedDict):
+    games: int
+    calls: dict[int, int]
+    """Percentiles of the number of calls until the first board wins"""
+    winners: dict[int, int]
+    """Percentiles of the number of boards winning on that call"""
+    mean_calls: float
+    mean_winners: float
+
+
+def _simulate_games(
+    pool_size: int, board_size: int, free_square: bool, boards: int, games: int, seed: int
+) -> tuple[Counter[int], Counter[int]]:
+    """Simulate games, returning histograms of game lengths and simultaneous winners"""
+    pool = TilePool(frozenset(Tile(str(i)) for i in range(pool_size)))
+    rng = random.Random(seed)
+    cells = board_size * board_size - free_square
+    mid = board_size // 2 * board_size + board_size // 2
+
+    getters = []
+    for mask in line_masks(board_size):
+        line = [cell for cell in range(board_size * board_size) if mask >> cell & 1]
+        getters.append(itemgetter(*line) if len(line) > 1 else itemgetter(line[0], line[0]))
+
+    lengths: Counter[int] = Counter()
+    winners: Counter[int] = Counter()
+    for _ in range(games):
+        first, count = pool_size, 0
+        for _ in range(boards):
+            calls = pool.sample_indices(cells, rng=rng)
+            if free_square:
+                calls.insert(mid, -1)
+            win = min(max(getter(calls)) for getter in getters)
+            if win < first:
+                first, count = win, 1
+            elif win == first:
+                count += 1
+        lengths[first + 1] += 1
+        winners[count] += 1
+    return lengths, winners
+
+
+def _simulate_task(task: tuple[int, int, bool, int, int, int]) -> tuple[Counter, Counter]:
+    return _simulate_games(*task)
+
+
+def percentiles(histogram: Counter[int], qs: Sequence[int] = PERCENTILES) -> dict[int, int]:
+    """Return nearest rank percentiles of a histogram"""
+    total = histogram.total()
+    values = sorted(histogram.items())
+    result = {}
+    for q in qs:
+        rank = max(1, -(-q * total // 100))
+        seen = 0
+        for value, count in values:
+            seen += count
+            if seen >= rank:
+                result[q] = value
+                break
+    return result
+
+
+def simulate(
+    pool_size: int,
+    board_size: int = 5,
+    free_square: bool = True,
+    boards: int = 100,
+    games: int = 10_000,
+    seed: int | None = None,
+    workers: int | None = None,
+) -> SimulationReport:
+    """Simulate games with boards per game, spread across a process pool
+
+    Raises:
+        ValueError: the pool is too small for the boards
+    """
+    cells = board_size * board_size - free_square
+    if not 0 <= cells <= pool_size or boards < 1 or games < 1:
+        raise ValueError("Invalid simulation parameters")
+
+    # games are split into a fixed number of chunks, so a seed gives the same report
+    # whatever the number of workers
+    workers = workers or os.cpu_count() or 1
+    chunks = min(games, CHUNKS)
+    rng = CardRandom(seed)
+    tasks = [
+        (
+            pool_size,
+            board_size,
+            free_square,
+            boards,
+            games // chunks + (i < games % chunks),
+            rng.spawn(i).getrandbits(64),
+        )
+        for i in range(chunks)
+    ]
+
+    if workers == 1:
+        results = [_simulate_games(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(_simulate_task, tasks))
+
+    lengths: Counter[int] = Counter()
+    winners: Counter[int] = Counter()
+    for chunk_lengths, chunk_winners in results:
+        lengths.update(chunk_lengths)
+        winners.update(chunk_winners)
+
+    return {
+        "games": games,
+        "calls": percentiles(lengths),
+        "winners": percentiles(winners),
+        "mean_calls": sum(k * v for k, v in lengths.items()) / games,
+        "mean_winners": sum(k * v for k, v in winners.items()) / games,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate bingo games")
+    parser.add_argument("pool_size", type=int, help="number of tiles in the pool")
+    parser.add_argument("--board-size", type=int, default=5)
+    parser.add_argument("--no-free", action="store_true", help="boards without a free square")
+    parser.add_argument("--boards", type=int, default=100, help="boards playing each game")
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    report = simulate(
+        args.pool_size,
+        args.board_size,
+        not args.no_free,
+        args.boards,
+        args.games,
+        args.seed,
+        args.workers,
+    )
+    print(f"games: {report['games']}")
+    print(f"mean calls: {report['mean_calls']:.2f}, mean winners: {report['mean_winners']:.3f}")
+    for q in PERCENTILES:
+        print(f"p{q:<3} calls: {report['calls'][q]:5}  winners: {report['winners'][q]:5}")
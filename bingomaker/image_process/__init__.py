@@ -1,3 +1,4 @@
 from bingomaker.image_process.processImage import resize_gif, resize_image
+from bingomaker.image_process.render import SheetLayout, render_cards
 
-__all__ = ["resize_image", "resize_gif"]
+__all__ = ["resize_image", "resize_gif", "SheetLayout", "render_cards"]
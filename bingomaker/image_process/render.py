@@ -0,0 +1,343 @@
+"""Printable sheets of bingo cards
+
+Cards are laid out on pages and rendered in a process pool. Each worker receives the pool
+once and then only the pool indices of the cards on a page, rendering every tile into a
+cell bitmap a single time and reusing it across cards. Pages are written as soon as they
+are rendered, either as PNG files or streamed into a PDF, so memory stays bounded by the
+number of pages in flight regardless of the number of cards.
+"""
+
+import contextlib
+import functools
+import io
+import math
+import os
+import textwrap
+import urllib.request
+import zlib
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO
+from urllib.parse import urlparse
+
+from PIL import Image, ImageDraw, ImageFont
+
+from bingomaker.game.game import Board, TilePool
+from bingomaker.images.image_manager import ImageManager
+
+Page = list[tuple[str, list[int]]]
+"""The id and pool indices of every card on a page"""
+
+ImageSource = tuple[str, bool]
+"""The uri of a tile image, and whether it is a managed image which may be a local file"""
+
+URL_SCHEMES = ("http", "https")
+"""Schemes image urls of tiles may use, anything else could read local files"""
+
+
+class SheetLayout:
+    """The arrangement of cards on a printed page, with lengths in inches"""
+
+    def __init__(
+        self,
+        page_size: tuple[float, float] = (8.5, 11),
+        columns: int = 2,
+        rows: int = 2,
+        margin: float = 0.5,
+        dpi: int = 150,
+        font_path: str | None = None,
+    ):
+        if columns < 1 or rows < 1 or dpi < 1:
+            raise ValueError("columns, rows and dpi must be positive")
+
+        self.page_size = page_size
+        self.columns = columns
+        self.rows = rows
+        self.margin = margin
+        self.dpi = dpi
+        self.font_path = font_path
+
+        self.width = round(page_size[0] * dpi)
+        self.height = round(page_size[1] * dpi)
+        gutter = round(margin * dpi)
+        self.gutter = gutter
+        label = self.label_height
+        self.card_size = min(
+            (self.width - gutter * (columns + 1)) // columns,
+            (self.height - gutter * (rows + 1)) // rows - label,
+        )
+        if self.card_size < 1:
+            raise ValueError("Cards do not fit on the page")
+
+    @property
+    def cards_per_page(self) -> int:
+        return self.columns * self.rows
+
+    @property
+    def label_height(self) -> int:
+        return self.dpi // 6
+
+    def font(self, size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+        if self.font_path is not None:
+            return ImageFont.truetype(self.font_path, size)
+        return ImageFont.load_default(size)
+
+
+class PdfWriter:
+    """Write a PDF with one full page image per page, one page at a time
+
+    Only the offsets of written objects are kept, so pages can be streamed to disk without
+    holding the document in memory.
+    """
+
+    def __init__(self, fp: BinaryIO, page_size: tuple[float, float]):
+        self._fp = fp
+        self._width, self._height = page_size[0] * 72, page_size[1] * 72
+        self._offsets: list[int] = [0, 0]  # the catalog and page tree are written last
+        self._pages: list[int] = []
+        fp.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write_object(self, body: bytes, number: int | None = None) -> int:
+        if number is None:
+            self._offsets.append(0)
+            number = len(self._offsets)
+        self._offsets[number - 1] = self._fp.tell()
+        self._fp.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        return number
+
+    def _write_stream(self, data: bytes, entries: bytes = b"") -> int:
+        header = b"<< %s /Length %d >>\nstream\n" % (entries, len(data))
+        return self._write_object(header + data + b"\nendstream")
+
+    def add_page(self, width: int, height: int, data: bytes):
+        """Add a page from zlib compressed 8 bit RGB pixels"""
+        image = self._write_stream(
+            data,
+            b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+            b"/BitsPerComponent 8 /Filter /FlateDecode" % (width, height),
+        )
+        size = b"%.2f 0 0 %.2f" % (self._width, self._height)
+        contents = self._write_stream(b"q %s 0 0 cm /Im0 Do Q" % size)
+        self._pages.append(
+            self._write_object(
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+                b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+                % (self._width, self._height, image, contents)
+            )
+        )
+
+    def close(self):
+        """Write the page tree and cross reference table, leaving the file open"""
+        kids = b" ".join(b"%d 0 R" % page for page in self._pages)
+        self._write_object(b"<< /Type /Catalog /Pages 2 0 R >>", 1)
+        self._write_object(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._pages)), 2)
+
+        xref = self._fp.tell()
+        self._fp.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self._offsets) + 1))
+        self._fp.write(b"".join(b"%010d 00000 n \n" % offset for offset in self._offsets))
+        self._fp.write(
+            b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(self._offsets) + 1, xref)
+        )
+
+
+def fetch_image(uri: str, managed: bool = False) -> Image.Image:
+    """Download an image, treating urls without a scheme as https
+
+    Only http and https urls are fetched, unless the uri was returned by an ImageManager
+    (managed), which may also point to a local file.
+
+    Raises:
+        OSError: the image could not be fetched or decoded
+        ValueError: uri is not a valid url or uses a scheme which is not allowed
+    """
+    scheme = urlparse(uri).scheme
+    if not scheme:
+        uri, scheme = f"https://{uri}", "https"
+    if scheme not in URL_SCHEMES and not (managed and scheme == "file"):
+        raise ValueError(f"Image urls with a {scheme} scheme are not allowed")
+    with urllib.request.urlopen(uri, timeout=30) as response:
+        image = Image.open(io.BytesIO(response.read()))
+        image.load()
+    return image
+
+
+class _SheetRenderer:
+    """Renders pages of cards, caching the bitmap of every tile it has drawn"""
+
+    def __init__(self, pool: TilePool, layout: SheetLayout):
+        self.pool = pool
+        self.layout = layout
+        self._label_font = layout.font(max(8, layout.label_height * 3 // 4))
+        self._cell = functools.lru_cache(maxsize=1024)(self._render_cell)
+        self._image = functools.lru_cache(maxsize=256)(self._fetch_image)
+
+    def _fetch_image(self, source: ImageSource) -> Image.Image | None:
+        try:
+            return fetch_image(*source).convert("RGBA")
+        except (OSError, ValueError):
+            return None
+
+    def _render_text(self, text: str, size: int) -> Image.Image:
+        cell = Image.new("RGB", (size, size), "white")
+        draw = ImageDraw.Draw(cell)
+        pad = max(2, size // 16)
+
+        # shrink the font until the wrapped text fits inside of the cell
+        for font_size in range(max(8, size // 5), 5, -2):
+            font = self.layout.font(font_size)
+            width = max(1, int((size - 2 * pad) / max(1.0, font.getlength("n"))))
+            wrapped = "\n".join(textwrap.wrap(text, width=width))
+            left, top, right, bottom = draw.multiline_textbbox((0, 0), wrapped, font=font)
+            if right - left <= size - 2 * pad and bottom - top <= size - 2 * pad:
+                break
+        draw.multiline_text(
+            (size // 2, size // 2), wrapped, fill="black", font=font, anchor="mm", align="center"
+        )
+        return cell
+
+    def _render_cell(self, index: int, size: int, source: ImageSource | None) -> Image.Image:
+        tile = self.pool.get_free() if index == Board.FREE else self.pool[index]
+        if source is None or (image := self._image(source)) is None:
+            return self._render_text(tile.text, size)
+
+        cell = Image.new("RGB", (size, size), "white")
+        image = image.copy()
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        cell.paste(image, ((size - image.width) // 2, (size - image.height) // 2), image)
+        return cell
+
+    def render(self, page: Page, uris: dict[int, ImageSource]) -> Image.Image:
+        layout = self.layout
+        sheet = Image.new("RGB", (layout.width, layout.height), "white")
+        draw = ImageDraw.Draw(sheet)
+
+        for n, (id_, indices) in enumerate(page):
+            column, row = n % layout.columns, n // layout.columns
+            x = layout.gutter + column * (layout.card_size + layout.gutter)
+            y = layout.gutter + row * (layout.card_size + layout.label_height + layout.gutter)
+
+            size = math.isqrt(len(indices))
+            cell = layout.card_size // size
+            for i, index in enumerate(indices):
+                left, top = x + i % size * cell, y + i // size * cell
+                sheet.paste(self._cell(index, cell, uris.get(index)), (left, top))
+            for i in range(size + 1):
+                draw.line((x + i * cell, y, x + i * cell, y + size * cell), fill="black")
+                draw.line((x, y + i * cell, x + size * cell, y + i * cell), fill="black")
+            draw.text((x, y + size * cell + 2), id_, fill="black", font=self._label_font)
+        return sheet
+
+
+_renderer: _SheetRenderer | None = None
+
+
+def _init_worker(pool: TilePool, layout: SheetLayout):
+    global _renderer
+    _renderer = _SheetRenderer(pool, layout)
+
+
+def _render_pdf_page(page: Page, uris: dict[int, ImageSource]) -> tuple[int, int, bytes]:
+    assert _renderer is not None
+    sheet = _renderer.render(page, uris)
+    return sheet.width, sheet.height, zlib.compress(sheet.tobytes(), 6)
+
+
+def _render_png_page(page: Page, uris: dict[int, ImageSource], path: Path):
+    assert _renderer is not None
+    _renderer.render(page, uris).save(path, "PNG", dpi=(_renderer.layout.dpi,) * 2)
+
+
+def _pages(
+    pool: TilePool, boards: Iterable[Board], layout: SheetLayout, images: ImageManager | None
+) -> Iterator[tuple[Page, dict[int, ImageSource]]]:
+    """Group boards into pages, resolving the image of each image tile once"""
+    resolved: dict[int, ImageSource | None] = {}
+
+    def resolve(index: int) -> ImageSource | None:
+        if index not in resolved:
+            tile = pool.get_free() if index == Board.FREE else pool[index]
+            uri = tile.image_url
+            source = None if uri is None else (uri, False)
+            if uri is not None and images is not None:
+                # image tiles refer to managed images by id, possibly as part of a url
+                id_ = urlparse(uri).path.rstrip("/").rsplit("/", 1)[-1]
+                with contextlib.suppress(FileNotFoundError):
+                    source = images.get_image(id_), True
+            resolved[index] = source
+        return resolved[index]
+
+    page: Page = []
+    uris: dict[int, ImageSource] = {}
+    for board in boards:
+        page.append((board.id or str(board.seed), board.indices))
+        for index in board.indices:
+            if (source := resolve(index)) is not None:
+                uris[index] = source
+        if len(page) == layout.cards_per_page:
+            yield page, uris
+            page, uris = [], {}
+    if page:
+        yield page, uris
+
+
+def render_cards(
+    pool: TilePool,
+    boards: Iterable[Board],
+    path: str | Path,
+    layout: SheetLayout | None = None,
+    images: ImageManager | None = None,
+    workers: int | None = None,
+) -> int:
+    """Render boards drawn from pool onto printable pages, returning the number of pages
+
+    A path ending in .pdf is written as a single PDF, any other path is a directory which
+    receives a PNG per page. Image tiles are looked up through images when given and
+    otherwise fetched directly from their urls.
+    """
+    layout = layout or SheetLayout()
+    path = Path(path)
+    pdf = path.suffix.lower() == ".pdf"
+    if not pdf:
+        path.mkdir(parents=True, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(pool, layout)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(pool, layout))
+
+    def rendered() -> Iterator:
+        """Render pages in order, keeping a bounded number of pages in flight"""
+        in_flight: deque[Future] = deque()
+        for number, (page, uris) in enumerate(_pages(pool, boards, layout, images)):
+            args = (page, uris) if pdf else (page, uris, path / f"page-{number + 1:05d}.png")
+            function = _render_pdf_page if pdf else _render_png_page
+            if executor is None:
+                yield function(*args)
+                continue
+            in_flight.append(executor.submit(function, *args))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+    pages = 0
+    try:
+        if pdf:
+            with open(path, "wb") as f:
+                writer = PdfWriter(f, layout.page_size)
+                for width, height, data in rendered():
+                    writer.add_page(width, height, data)
+                    pages += 1
+                writer.close()
+        else:
+            for _ in rendered():
+                pages += 1
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return pages
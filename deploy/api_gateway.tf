@@ -1,6 +1,8 @@
 resource "aws_api_gateway_rest_api" "bingo_maker_api" {
   name        = "BingoMakerAPI"
   description = "API for managing Bingo Maker tile pools and cards"
+  # binary cards are returned base64 encoded by the lambda and decoded by the gateway
+  binary_media_types = ["application/octet-stream"]
   body        = templatefile("../api-template.yaml", {
     lab-role-arn = data.aws_iam_role.lab_role.arn,
     tilepools-get-function-arn = aws_lambda_function.functions["get_tilepools.py"].arn,
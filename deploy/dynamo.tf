@@ -1,4 +1,3 @@
-
 # DynamoDB Table
 resource "aws_dynamodb_table" "bingo_maker" {
   name         = var.dynamodb_table_name
@@ -10,6 +9,61 @@ resource "aws_dynamodb_table" "bingo_maker" {
     type = "S"
   }
 
+  # pools are spread over a few listing partitions, sorted by each listing sort key
+  attribute {
+    name = "listing"
+    type = "S"
+  }
+
+  attribute {
+    name = "createdAt"
+    type = "S"
+  }
+
+  # the start of the name, since keys are limited to 1024 bytes
+  attribute {
+    name = "nameKey"
+    type = "S"
+  }
+
+  attribute {
+    name = "owner"
+    type = "S"
+  }
+
+  global_secondary_index {
+    name            = "byCreatedAt"
+    hash_key        = "listing"
+    range_key       = "createdAt"
+    projection_type = "KEYS_ONLY"
+    read_capacity   = 1
+    write_capacity  = 1
+  }
+
+  global_secondary_index {
+    name            = "byName"
+    hash_key        = "listing"
+    range_key       = "nameKey"
+    projection_type = "KEYS_ONLY"
+    read_capacity   = 1
+    write_capacity  = 1
+  }
+
+  # deleting the pools of an owner also needs the chunk layout of each pool
+  global_secondary_index {
+    name               = "byOwner"
+    hash_key           = "listing"
+    range_key          = "owner"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["chunks", "chunkSet"]
+    read_capacity      = 1
+    write_capacity     = 1
+  }
+
   read_capacity  = 1
   write_capacity = 1
 }
+
+output "dynamodb_table_name" {
+  value = aws_dynamodb_table.bingo_maker.name
+}
@@ -36,7 +36,8 @@ def lambda_handler(event, context):
         "name": result["name"],
         "owner": result["owner"],
         "created_at": result["created_at"],
-        "tiles": [tile_to_dict(tile) for tile in result["tiles"].tiles],
+        "tiles": [tile_to_dict(tile) for tile in result["tiles"]],
+        "version": result["tiles"].version,
     }
 
     if free := result["tiles"].free:
@@ -10,7 +10,7 @@ def lambda_handler(event, context):
     query_params = event.get("queryStringParameters", {}) or {}
     try:
         size = int(query_params.get("size", 25))
-        page = int(query_params.get("page", 1))
+        page = int(query_params["page"]) if "page" in query_params else None
     except ValueError:
         return {
             "headers": {
@@ -40,7 +40,26 @@ def lambda_handler(event, context):
     else:
         sort_asc = True
 
-    if (results := db.get_tile_pools(size, page, sort, sort_asc)) is None:
+    # pages without a page number are followed with the cursor in X-Next-Cursor
+    next_cursor = None
+    if page is None:
+        try:
+            page_result = db.get_tile_pools_page(size, query_params.get("cursor"), sort, sort_asc)
+        except ValueError:
+            return {
+                "headers": {
+                    "Access-Control-Allow-Headers": "Content-Type",
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+                },
+                "statusCode": 400,
+                "body": "Invalid cursor",
+            }
+        results, next_cursor = page_result if page_result is not None else (None, None)
+    else:
+        results = db.get_tile_pools(size, page, sort, sort_asc)
+
+    if results is None:
         return {
             "headers": {
                 "Access-Control-Allow-Headers": "Content-Type",
@@ -58,18 +77,24 @@ def lambda_handler(event, context):
             "name": result["name"],
             "owner": result["owner"],
             "created_at": result["created_at"],
-            "tiles": [tile_to_dict(tile) for tile in result["tiles"].tiles],
+            "tiles": [tile_to_dict(tile) for tile in result["tiles"]],
+            "version": result["tiles"].version,
         }
         if free := result["tiles"].free:
             item["free_tile"] = tile_to_dict(free)
         body.append(item)
 
+    headers = {
+        "Access-Control-Allow-Headers": "Content-Type",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+        "Access-Control-Expose-Headers": "X-Next-Cursor",
+    }
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+
     return {
-        "headers": {
-            "Access-Control-Allow-Headers": "Content-Type",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
-        },
+        "headers": headers,
         "statusCode": 200,
         "body": json.dumps(body),
     }
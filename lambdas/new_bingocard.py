@@ -1,12 +1,16 @@
+import base64
 import json
 import random
 
-from lambda_helper import get_pool_manager
+from lambda_helper import get_cached_pool_manager
 
 from bingomaker.data.persistence import tile_to_dict
-from bingomaker.game import Board
+from bingomaker.data.serialization import board_to_bytes, board_to_compact
+from bingomaker.game import Board, NoMatchingTile
+from bingomaker.game.cardid import MAX_SIZE, card_id
+from bingomaker.game.rng import MASK64
 
-db = get_pool_manager()
+db = get_cached_pool_manager()
 
 
 def lambda_handler(event, context):
@@ -26,7 +30,22 @@ def lambda_handler(event, context):
     query_params = event.get("queryStringParameters", {}) or {}
     try:
         size = int(query_params.get("size", 5))
-        seed = int(query_params.get("seed", random.randint(0, 1 << 16)))
+        if not 0 < size <= MAX_SIZE:
+            raise ValueError(f"size must be between 1 and {MAX_SIZE}")
+        seed = int(query_params.get("seed", random.getrandbits(64)))
+        if not 0 <= seed <= MASK64:
+            raise ValueError(f"seed must be between 0 and {MASK64}")
+        compat = query_params.get("compat", "false").lower() in ("true", "1", "t", "yes")
+        multi_params = event.get("multiValueQueryStringParameters", {}) or {}
+        excluded_tags = frozenset(
+            tag
+            for value in multi_params.get("excluded_tags", [query_params.get("excluded_tags", "")])
+            for tag in value.split(",")
+            if tag
+        )
+        format_ = query_params.get("format", "full")
+        if format_ not in ("full", "compact", "binary"):
+            raise ValueError(f"Unknown card format {format_}")
     except ValueError:
         return {
             "headers": {
@@ -50,14 +69,49 @@ def lambda_handler(event, context):
         }
 
     pool = result["tiles"]
-    board = Board(pool, size=size, free_square=pool.free is not None, seed=seed)
+    try:
+        board = Board(
+            pool,
+            size=size,
+            free_square=pool.free is not None,
+            seed=seed,
+            exclude_tags=excluded_tags,
+            compat=compat,
+        )
+    except NoMatchingTile as e:
+        return {
+            "headers": {
+                "Access-Control-Allow-Headers": "Content-Type",
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+            },
+            "statusCode": 400,
+            "body": str(e),
+        }
     board.id = str(seed)
 
-    body = {
-        "id": board.id,
-        "size": board.size,
-        "tiles": [tile_to_dict(tile) for row in board.board for tile in row],
-    }
+    if format_ == "binary":
+        return {
+            "headers": {
+                "Access-Control-Allow-Headers": "Content-Type",
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+                "Content-Type": "application/octet-stream",
+            },
+            "statusCode": 200,
+            "body": base64.b64encode(board_to_bytes(pool, board)).decode(),
+            "isBase64Encoded": True,
+        }
+
+    if format_ == "compact":
+        body = {"id": board.id, "card_id": card_id(pool, board), **board_to_compact(pool, board)}
+    else:
+        body = {
+            "id": board.id,
+            "card_id": card_id(pool, board),
+            "size": board.size,
+            "tiles": [tile_to_dict(tile) for row in board.board for tile in row],
+        }
 
     return {
         "headers": {
@@ -37,7 +37,7 @@ def lambda_handler(event, context):
             pool = TilePool(tiles, dict_to_tile(free))
         else:
             pool = TilePool(tiles)
-    except (ValueError, KeyError):
+    except (TypeError, ValueError, KeyError):
         return {
             "headers": {
                 "Access-Control-Allow-Headers": "Content-Type",
@@ -75,7 +75,8 @@ def lambda_handler(event, context):
         "name": result["name"],
         "owner": result["owner"],
         "created_at": result["created_at"],
-        "tiles": [tile_to_dict(tile) for tile in result["tiles"].tiles],
+        "tiles": [tile_to_dict(tile) for tile in result["tiles"]],
+        "version": result["tiles"].version,
     }
     if free := result["tiles"].free:
         body["free_tile"] = tile_to_dict(free)
@@ -57,7 +57,7 @@ def lambda_handler(event, context):
     if insertions:
         try:
             parsed_insertions = [dict_to_tile(tile) for tile in insertions]
-        except (TypeError, KeyError):
+        except (TypeError, ValueError, KeyError):
             return {
                 "headers": {
                     "Access-Control-Allow-Headers": "Content-Type",
@@ -97,7 +97,8 @@ def lambda_handler(event, context):
         "name": result["name"],
         "owner": result["owner"],
         "created_at": result["created_at"],
-        "tiles": [tile_to_dict(tile) for tile in result["tiles"].tiles],
+        "tiles": [tile_to_dict(tile) for tile in result["tiles"]],
+        "version": result["tiles"].version,
     }
     if free := result["tiles"].free:
         body["free_tile"] = tile_to_dict(free)
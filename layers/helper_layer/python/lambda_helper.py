@@ -1,6 +1,6 @@
 import boto3
 
-from bingomaker.data import DynamoTilePoolDB
+from bingomaker.data import CachingTilePoolDB, DynamoTilePoolDB
 from bingomaker.images import DynamoReferenceCounts, S3ImageManager
 
 
@@ -9,6 +9,14 @@ def get_pool_manager() -> DynamoTilePoolDB:
     return DynamoTilePoolDB(table_name)
 
 
+def get_cached_pool_manager(ttl: float = 30.0) -> CachingTilePoolDB:
+    """A pool manager which keeps pools in memory across warm invocations of a lambda
+
+    Writes made by other lambdas are only seen once a cached pool is older than ttl seconds.
+    """
+    return CachingTilePoolDB(get_pool_manager(), ttl=ttl)
+
+
 def get_counts_manager() -> DynamoReferenceCounts:
     table_name = "BingoMakerImageCounts"
     return DynamoReferenceCounts(table_name)
@@ -0,0 +1,189 @@
+"""Microbenchmarks for the game and data layers
+
+Usage: python scripts/benchmark.py [name ...]
+"""
+
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bingomaker.data.dynamodb import (  # noqa: E402
+    DynamoTilePoolDB,
+    _dynamodb_to_tile,
+    _tile_to_dynamodb,
+)
+from bingomaker.game.cardset import generate_card_set  # noqa: E402
+from bingomaker.game.columnar import ColumnarTilePool  # noqa: E402
+from bingomaker.game.game import Board, Tile, TilePool, generate_boards  # noqa: E402
+from bingomaker.game.session import GameSession  # noqa: E402
+from bingomaker.image_process.render import render_cards  # noqa: E402
+
+
+def report(name: str, func: Callable[[], object], number: int = 10):
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"  {name:<32} {best * 1e3:10.3f} ms")
+
+
+def traced_size(func: Callable[[], object]) -> int:
+    """Return the number of bytes still allocated by the result of func"""
+    tracemalloc.start()
+    result = func()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def make_tiles(count: int, offset: int = 0) -> list[Tile]:
+    return [
+        Tile(f"Tile {i}", frozenset([f"tag_{i % 16}", f"group_{i % 5}"]))
+        for i in range(offset, offset + count)
+    ]
+
+
+def bench_tiles():
+    count = 50_000
+    print(f"tiles ({count} tiles per pool)")
+
+    size = traced_size(lambda: make_tiles(count))
+    print(f"  {'memory':<32} {size / 1024 / 1024:10.3f} MiB")
+
+    tiles = make_tiles(count)
+    other = make_tiles(count, count // 2)
+    left, right = TilePool(frozenset(tiles)), TilePool(frozenset(other))
+
+    report("construct", lambda: make_tiles(count), number=1)
+    report("frozenset", lambda: frozenset(tiles))
+    report("pool add", lambda: left + right, number=1)
+    report("pool sub", lambda: left - right, number=1)
+    report("set intersection", lambda: left.tiles & right.tiles)
+
+
+def bench_columnar():
+    count = 50_000
+    print(f"columnar ({count} tiles per pool)")
+
+    for cls in (TilePool, ColumnarTilePool):
+        size = traced_size(lambda cls=cls: cls(frozenset(make_tiles(count))))
+        print(f"  {cls.__name__ + ' memory':<32} {size / 1024 / 1024:10.3f} MiB")
+
+    pool = TilePool(frozenset(make_tiles(count)))
+    columnar = ColumnarTilePool.from_pool(pool)
+    for p in (pool, columnar):
+        name = type(p).__name__
+        report(f"{name} board", lambda p=p: Board(p, free_square=False), number=1000)
+
+
+def bench_cards():
+    count = 10_000
+    print(f"cards ({count} tiles per pool)")
+
+    pool = TilePool(frozenset(make_tiles(count)), Tile("Free"))
+    report("board", lambda: Board(pool, seed=1 << 40), number=1000)
+    report("board compat", lambda: Board(pool, seed=1 << 40, compat=True), number=1000)
+    report("board excluded tags", lambda: Board(pool, exclude_tags=["tag_0"]), number=1000)
+
+
+def bench_cardsets():
+    print("cardsets (1000 tiles per pool)")
+
+    pool = TilePool(frozenset(make_tiles(1000)), Tile("Free"))
+    for max_overlap in (None, 22):
+        for count in (1_000, 10_000, 100_000):
+            start = time.perf_counter()
+            for _ in generate_card_set(pool, count, max_overlap=max_overlap):
+                pass
+            elapsed = time.perf_counter() - start
+            name = f"{count} cards, max overlap {max_overlap}"
+            print(f"  {name:<32} {count / elapsed:10.0f} cards/s")
+
+
+def bench_session():
+    count = 50_000
+    for pool_size in (75, 1000):
+        print(f"session ({count} cards, {pool_size} tile pool)")
+
+        pool = TilePool(frozenset(make_tiles(pool_size)), Tile("Free"))
+        session = GameSession(pool, seed=0)
+        for board in generate_boards(pool, count):
+            session.register(board)
+
+        calls = []
+        while len(session.calls) < len(pool):
+            start = time.perf_counter()
+            session.draw()
+            calls.append(time.perf_counter() - start)
+        print(f"  {'mean call':<32} {sum(calls) / len(calls) * 1e3:10.3f} ms")
+        print(f"  {'max call':<32} {max(calls) * 1e3:10.3f} ms")
+
+
+def bench_dynamodb_codec():
+    count = 10_000
+    print(f"dynamodb codec ({count} tiles per pool)")
+
+    db = DynamoTilePoolDB()
+    tiles = [
+        Tile(f"{i}", frozenset([f"{i % 10}", "all"]), f"url {i}" if i % 3 else None, i % 4 + 1)
+        for i in range(count)
+    ]
+    encoded = {"M": {tile.text: _tile_to_dynamodb(tile) for tile in tiles}}
+
+    # pools were converted through the generic functions before the tile codec
+    def generic_encode():
+        return db._dict_to_dynamodb(
+            {
+                "tileMap": {
+                    tile.text: {
+                        "content": tile.text,
+                        "tags": list(tile.tags),
+                        "imageUrl": tile.image_url,
+                        "weight": tile.weight,
+                    }
+                    for tile in tiles
+                }
+            }
+        )
+
+    def generic_decode():
+        return frozenset(
+            Tile(item["content"], frozenset(item["tags"]), item["imageUrl"], item["weight"])
+            for item in db._dynamodb_to_dict({"": encoded})[""].values()
+        )
+
+    report("generic encode", generic_encode)
+    report("codec encode", lambda: {"M": {tile.text: _tile_to_dynamodb(tile) for tile in tiles}})
+    report("generic decode", generic_decode)
+    report("codec decode", lambda: frozenset(map(_dynamodb_to_tile, encoded["M"].values())))
+
+
+def bench_render():
+    count = 1_000
+    print(f"render ({count} cards, 4 per page, 1000 tile pool)")
+
+    pool = TilePool(frozenset(make_tiles(1000)), Tile("Free"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("cards.pdf", "png"):
+            start = time.perf_counter()
+            render_cards(pool, generate_boards(pool, count), Path(tmp) / name)
+            print(f"  {name:<32} {(time.perf_counter() - start) * 1e3:10.3f} ms")
+
+
+BENCHMARKS = {
+    "tiles": bench_tiles,
+    "columnar": bench_columnar,
+    "cards": bench_cards,
+    "cardsets": bench_cardsets,
+    "session": bench_session,
+    "dynamodb": bench_dynamodb_codec,
+    "render": bench_render,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
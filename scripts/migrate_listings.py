@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+"""Move the tile pools of a DynamoDB table into the listing indexes
+
+Pools missing from the listing partitions or name keys, such as pools stored before the
+indexes existed, are not listed and are not found when deleting the pools of an owner. This
+is safe to run repeatedly and is run by `make remote-deploy` after every apply.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bingomaker.data import DynamoTilePoolDB  # noqa: E402
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("table_name", nargs="?", default="BingoMaker")
+parser.add_argument("--endpoint-url", help="DynamoDB endpoint, such as a localstack")
+args = parser.parse_args()
+
+db = DynamoTilePoolDB(args.table_name, args.endpoint_url)
+print(f"Migrated {db.migrate_listings()} tile pools")
@@ -1,4 +1,5 @@
 import io
+import json
 from copy import deepcopy
 from datetime import datetime
 
@@ -17,6 +18,7 @@ from bingomaker.data.persistence import (
     dict_to_tile,
     tile_to_dict,
 )
+from bingomaker.data.serialization import boards_from_bytes
 from bingomaker.game.game import Tile, TilePool
 from bingomaker.images.image_manager import ImageManager
 from bingomaker.images.local import LocalImageManager
@@ -128,6 +130,12 @@ class TestBingoCard:
         assert response.status_code == 400
         response = client.get("/bingocard/basic", query_string={"seed": "foo"})
         assert response.status_code == 400
+        response = client.get("/bingocard/basic", query_string={"size": 0})
+        assert response.status_code == 400
+        response = client.get("/bingocard/basic", query_string={"seed": -1})
+        assert response.status_code == 400
+        response = client.get("/bingocard/basic", query_string={"seed": 1 << 64})
+        assert response.status_code == 400
 
     def test_get_bingocard(self, client: FlaskClient):
         response = client.get("/bingocard/basic", query_string={"seed": 20})
@@ -139,6 +147,133 @@ class TestBingoCard:
         assert len(body["tiles"]) == 25
         assert body["tiles"][12]["content"] == "Free"
 
+    def test_get_bingocard_excluded_tags(self, client: FlaskClient):
+        response = client.get("/bingocard/basic?size=4&excluded_tags=0,1&excluded_tags=2")
+        assert response.status_code == 200
+        assert (body := response.json)
+        assert not {"0", "1", "2"} & {tile["content"] for tile in body["tiles"]}
+
+        response = client.get("/bingocard/basic", query_string={"excluded_tags": "0,1"})
+        assert response.status_code == 400
+        assert "24 needed, 23 available" in response.text
+
+        response = client.post(
+            "/bingocard/basic/batch", json={"count": 5, "size": 4, "excluded_tags": ["0"]}
+        )
+        assert response.status_code == 200
+        for line in response.data.decode().splitlines():
+            assert "0" not in {tile["content"] for tile in json.loads(line)["tiles"]}
+
+        response = client.post("/bingocard/basic/batch", json={"count": 5, "excluded_tags": "0"})
+        assert response.status_code == 400
+
+    def test_get_compact_bingocard(self, client: FlaskClient):
+        full = client.get("/bingocard/basic", query_string={"seed": 20}).json
+        pool = client.get("/tilepools/basic").json
+        assert full and pool
+
+        response = client.get("/bingocard/basic", query_string={"seed": 20, "format": "compact"})
+        assert response.status_code == 200
+        assert (body := response.json)
+        assert body["card_id"] == full["card_id"]
+        assert body["version"] == pool["version"]
+        tiles = [pool["tiles"][i] if i != -1 else pool["free_tile"] for i in body["indices"]]
+        assert tiles == full["tiles"]
+
+        response = client.get("/bingocard/basic", query_string={"seed": 20, "format": "binary"})
+        assert response.status_code == 200
+        assert response.mimetype == "application/octet-stream"
+        [board] = boards_from_bytes(EXAMPLES["basic"]["tiles"], response.data)
+        assert board.indices == body["indices"]
+
+        response = client.post(
+            "/bingocard/basic/batch", json={"count": 3, "seed": 20, "format": "binary"}
+        )
+        assert response.status_code == 200
+        boards = list(boards_from_bytes(EXAMPLES["basic"]["tiles"], response.data, stream=True))
+        assert len(boards) == 3 and boards[0].indices == body["indices"]
+
+        response = client.get("/bingocard/basic", query_string={"format": "xml"})
+        assert response.status_code == 400
+
+    def test_decode_bingocard(self, client: FlaskClient):
+        card = client.get("/bingocard/basic", query_string={"seed": 20}).json
+        assert card
+
+        response = client.get(f"/bingocard/basic/card/{card['card_id']}")
+        assert response.status_code == 200
+        assert (body := response.json)
+        assert body["id"] == body["card_id"] == card["card_id"]
+        assert body["tiles"] == card["tiles"]
+
+        response = client.get(f"/bingocard/no_free/card/{card['card_id']}")
+        assert response.status_code == 404
+        response = client.get("/bingocard/basic/card/not-a-card")
+        assert response.status_code == 404
+
+    def test_bad_bingocard_batch_request(self, client: FlaskClient):
+        response = client.post("/bingocard/does-not-exist/batch", json={"count": 2})
+        assert response.status_code == 404
+
+        response = client.post("/bingocard/basic/batch", json={"seed": 1})
+        assert response.status_code == 400
+        response = client.post("/bingocard/basic/batch", json={"count": 0})
+        assert response.status_code == 400
+        response = client.post("/bingocard/basic/batch", json={"count": "foo"})
+        assert response.status_code == 400
+        response = client.post("/bingocard/basic/batch", json={"count": 2, "size": 6})
+        assert response.status_code == 400
+        response = client.post("/bingocard/basic/batch", json={"count": 2, "seed": -1})
+        assert response.status_code == 400
+        response = client.post("/bingocard/basic/batch", json={"count": 2, "compat": "false"})
+        assert response.status_code == 400
+        response = client.post(
+            "/bingocard/basic/batch", json={"count": 2, "compat": True, "unique": True}
+        )
+        assert response.status_code == 400
+
+    def test_get_bingocard_batch(self, client: FlaskClient):
+        response = client.post("/bingocard/basic/batch", json={"count": 10, "seed": 20})
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+
+        cards = [json.loads(line) for line in response.data.decode().splitlines()]
+        assert len(cards) == 10
+        assert [card["id"] for card in cards] == [str(20 + i) for i in range(10)]
+        for card in cards:
+            assert card["size"] == 5
+            assert len(card["tiles"]) == 25
+            assert card["tiles"][12]["content"] == "Free"
+
+        single = client.get("/bingocard/basic", query_string={"seed": 20}).json
+        assert single == cards[0]
+
+        response = client.post(
+            "/bingocard/basic/batch", json={"count": 2, "seed": 20, "compat": True}
+        )
+        cards = [json.loads(line) for line in response.data.decode().splitlines()]
+        single = client.get("/bingocard/basic", query_string={"seed": 20, "compat": "true"}).json
+        assert single == cards[0]
+
+    def test_get_unique_bingocard_batch(self, client: FlaskClient):
+        response = client.post(
+            "/bingocard/basic/batch", json={"count": 10, "seed": 20, "max_overlap": 23}
+        )
+        assert response.status_code == 200
+
+        cards = [json.loads(line) for line in response.data.decode().splitlines()]
+        assert len(cards) == 10
+        tiles = [frozenset(tile["content"] for tile in card["tiles"]) - {"Free"} for card in cards]
+        for i, a in enumerate(tiles):
+            assert all(len(a & b) <= 23 for b in tiles[i + 1 :])
+
+        response = client.post("/bingocard/basic/batch", json={"count": 2, "max_overlap": 5})
+        assert response.status_code == 400
+        response = client.post("/bingocard/basic/batch", json={"count": 2, "max_overlap": -1})
+        assert response.status_code == 400
+        response = client.post("/bingocard/basic/batch", json={"count": 100_000, "max_overlap": 2})
+        assert response.status_code == 400
+
 
 class TestGetPool:
     def test_get_missing_tilepool(self, client: FlaskClient):
@@ -304,6 +439,23 @@ class TestGetPools:
         else:
             assert len(body) == 2
 
+    def test_get_tilepools_cursor(self, client: FlaskClient):
+        ids = []
+        query = {"size": 2, "sort": "name"}
+        while True:
+            response = client.get("/tilepools", query_string=query)
+            ids.extend(pool["id"] for pool in self._validate_response(response))
+            if (cursor := response.headers.get("X-Next-Cursor")) is None:
+                break
+            query["cursor"] = cursor
+
+        assert ids == [pool["id"] for pool in sorted(EXAMPLES.values(), key=lambda p: p["name"])]
+
+        response = client.get("/tilepools", query_string={"size": 2, "cursor": "bad"})
+        assert response.status_code == 400
+        response = client.get("/tilepools", query_string={"page": 1, "cursor": cursor or ""})
+        assert response.status_code == 400
+
     @pytest.mark.parametrize("sort,sort_asc", SORT_METHODS)
     def test_get_sorted_tilepools(self, client: FlaskClient, sort: str | None, sort_asc: bool):
         query = {} if sort is None else {"sort": sort, "sortAsc": sort_asc}
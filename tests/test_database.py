@@ -1,9 +1,19 @@
+import contextlib
+import sqlite3
+
 import boto3
 import pytest
 from botocore.client import ClientError
 
-from bingomaker.data import DynamoTilePoolDB, FileTilePoolDB, MemoryTilePoolDB
-from bingomaker.data.persistence import TilePoolDB
+from bingomaker.data import (
+    CachingTilePoolDB,
+    DynamoTilePoolDB,
+    FileTilePoolDB,
+    MemoryTilePoolDB,
+    SQLiteTilePoolDB,
+)
+from bingomaker.data.dynamodb import _dynamodb_to_tile, _tile_to_dynamodb
+from bingomaker.data.persistence import SortMethod, TilePoolDB
 from bingomaker.game.game import Tile, TilePool
 
 DB_NAME = "BingoMakerTestDB"
@@ -26,11 +36,38 @@ class DynamoTilePoolDBTest(DynamoTilePoolDB):
         except ClientError as e:
             print(e)
         finally:
+            throughput = {"ReadCapacityUnits": 1, "WriteCapacityUnits": 1}
             self.client.create_table(
                 TableName=self.table_name,
                 KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
-                AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
-                ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
+                AttributeDefinitions=[
+                    {"AttributeName": name, "AttributeType": "S"}
+                    for name in ("id", "listing", "createdAt", "nameKey", "owner")
+                ],
+                GlobalSecondaryIndexes=[
+                    {
+                        "IndexName": index,
+                        "KeySchema": [
+                            {"AttributeName": "listing", "KeyType": "HASH"},
+                            {"AttributeName": sort_key, "KeyType": "RANGE"},
+                        ],
+                        "Projection": projection,
+                        "ProvisionedThroughput": throughput,
+                    }
+                    for index, sort_key, projection in (
+                        ("byCreatedAt", "createdAt", {"ProjectionType": "KEYS_ONLY"}),
+                        ("byName", "nameKey", {"ProjectionType": "KEYS_ONLY"}),
+                        (
+                            "byOwner",
+                            "owner",
+                            {
+                                "ProjectionType": "INCLUDE",
+                                "NonKeyAttributes": ["chunks", "chunkSet"],
+                            },
+                        ),
+                    )
+                ],
+                ProvisionedThroughput=throughput,
             )
 
 
@@ -38,12 +75,19 @@ class DynamoTilePoolDBTest(DynamoTilePoolDB):
     params=[
         FileTilePoolDB,
         MemoryTilePoolDB,
+        SQLiteTilePoolDB,
+        CachingTilePoolDB,
         pytest.param(DynamoTilePoolDBTest, marks=pytest.mark.localstack),
     ]
 )
 def db(request, tmp_path):
-    driver = request.param(tmp_path) if request.param is FileTilePoolDB else request.param()
-    return driver
+    if request.param is FileTilePoolDB:
+        return FileTilePoolDB(tmp_path)
+    if request.param is SQLiteTilePoolDB:
+        return SQLiteTilePoolDB(tmp_path / "tiles.sqlite3")
+    if request.param is CachingTilePoolDB:
+        return CachingTilePoolDB(FileTilePoolDB(tmp_path))
+    return request.param()
 
 
 @pytest.fixture
@@ -148,3 +192,445 @@ class TestTilePoolDB:
         assert len(tiles) == 3
         for tile in tiles:
             assert tile.text in ("4", "5", "6")
+
+    def test_get_tile_pools_page(self, many_pools: tuple[TilePoolDB, list[str]]):
+        db, pool_ids = many_pools
+
+        seen: list[str] = []
+        cursor = None
+        for _ in range(4):
+            assert (result := db.get_tile_pools_page(3, cursor, SortMethod.NAME, False))
+            page, cursor = result
+            seen.extend(pool["id"] for pool in page)
+            if cursor is None:
+                break
+        assert cursor is None
+        assert sorted(seen) == sorted(pool_ids)
+        pools = db.get_tile_pools(len(seen), sort=SortMethod.NAME) or ()
+        assert [pool["name"] for pool in pools][::-1] == [
+            pool["name"] for pool in (db.get_tile_pool(id_) for id_ in seen) if pool
+        ]
+
+        assert db.get_tile_pools_page(0) is None
+        with pytest.raises(ValueError):
+            db.get_tile_pools_page(3, "not a cursor")
+
+    def test_tile_weights(self, db: TilePoolDB):
+        tiles = frozenset(Tile(f"{i}", weight=i + 0.5) for i in range(3))
+        pool_id = db.insert_tile_pool("NAME", "owner", TilePool(tiles, Tile("Free")))
+        assert pool_id is not None
+        assert db.update_tiles(pool_id, insertions=[Tile("3", weight=2)])
+
+        result = db.get_tile_pool(pool_id)
+        assert result
+        assert result["tiles"].tiles == tiles | {Tile("3", weight=2)}
+
+
+class TestFileTilePoolDB:
+    def test_index_shared(self, tmp_path):
+        db = FileTilePoolDB(tmp_path)
+        other = FileTilePoolDB(tmp_path)
+        pool_id = db.insert_tile_pool("NAME", "owner", TilePool(frozenset([Tile("0")])))
+        assert pool_id is not None
+
+        assert (result := other.get_tile_pool(pool_id))
+        assert result["name"] == "NAME"
+        assert other.delete_tile_pool(pool_id)
+        assert db.get_tile_pool(pool_id) is None
+
+    def test_index_rebuild(self, tmp_path):
+        db = FileTilePoolDB(tmp_path)
+        pool = TilePool(frozenset([Tile("0")]))
+        pool_ids = [db.insert_tile_pool("NAME", f"owner {i % 2}", pool) for i in range(4)]
+
+        (tmp_path / FileTilePoolDB.INDEX_NAME).unlink()
+        db = FileTilePoolDB(tmp_path)
+        assert all(db.get_tile_pool(pool_id) for pool_id in pool_ids)
+
+        # files removed behind the database's back are dropped from the index
+        assert (path := db._find_first_by_id(pool_ids[0]))
+        path.unlink()
+        assert db.get_tile_pool(pool_ids[0]) is None
+
+        assert db.delete_tile_pool_by_owner("owner 1")
+        assert db.get_tile_pool(pool_ids[1]) is None
+        assert db.get_tile_pool(pool_ids[2])
+
+    def test_catalog(self, tmp_path):
+        db = FileTilePoolDB(tmp_path)
+        for name in "cab":
+            db.insert_tile_pool(name, "owner", TilePool(frozenset([Tile(name)])))
+
+        assert (pools := db.get_tile_pools(size=2, page=2, sort=SortMethod.NAME))
+        assert [pool["name"] for pool in pools] == ["c"]
+        assert (pools := db.get_tile_pools(size=2, sort=SortMethod.NAME, sort_asc=False))
+        assert [pool["name"] for pool in pools] == ["c", "b"]
+
+        # pools with the same name are paged in id order
+        for _ in range(4):
+            db.insert_tile_pool("b", "owner", TilePool(frozenset([Tile("b")])))
+        for sort_asc in (True, False):
+            pages = [db.get_tile_pools(1, page, SortMethod.NAME, sort_asc) for page in range(1, 8)]
+            ids = [pool["id"] for page in pages for pool in page or ()]
+            pools = db.get_tile_pools(sort=SortMethod.NAME, sort_asc=sort_asc) or []
+            assert ids == [pool["id"] for pool in pools] and len(set(ids)) == 7
+
+        # catalogs missing metadata columns are rebuilt from the files
+        with db._index() as conn:
+            conn.execute("DROP TABLE pools")
+            conn.execute("CREATE TABLE pools (id TEXT, owner TEXT, path TEXT)")
+        db = FileTilePoolDB(tmp_path)
+        assert (pools := db.get_tile_pools(sort=SortMethod.NAME))
+        assert [pool["name"] for pool in pools] == ["a", *"bbbbb", "c"]
+
+    def test_journal(self, tmp_path):
+        db = FileTilePoolDB(tmp_path, fsync="never")
+        pool_id = db.insert_tile_pool("NAME", "owner", TilePool(frozenset([Tile("0")])))
+        assert pool_id is not None
+        assert (filepath := db._find_first_by_id(pool_id))
+        journal = filepath.with_suffix(FileTilePoolDB.JOURNAL_SUFFIX)
+        base = filepath.read_bytes()
+
+        assert db.update_tiles(pool_id, insertions=[Tile("1"), Tile("2")])
+        assert db.update_tiles(pool_id, removals=["0", "1"], insertions=[Tile("0", weight=2)])
+        assert filepath.read_bytes() == base
+        # an append cut short is ignored and does not corrupt the next one
+        with open(journal, "ab") as f:
+            f.write(b'{"insert": [')
+        assert db.update_tiles(pool_id, insertions=[Tile("3")])
+
+        expected = TilePool(frozenset([Tile("0", weight=2), Tile("2"), Tile("3")]))
+        assert (result := db.get_tile_pool(pool_id)) and result["tiles"].tiles == expected.tiles
+        assert db.compact(pool_id)
+        assert not journal.exists()
+        assert (result := db.get_tile_pool(pool_id)) and result["tiles"].tiles == expected.tiles
+
+        # large journals are compacted as they are written
+        db.compact_bytes = 0
+        assert db.update_tiles(pool_id, insertions=[Tile("x" * len(base))])
+        assert not journal.exists()
+        assert db.delete_tile_pool(pool_id)
+        assert not any(tmp_path.rglob("*.json*"))
+
+
+class TestSQLiteTilePoolDB:
+    def test_sorted_pages(self, tmp_path):
+        db = SQLiteTilePoolDB(tmp_path / "tiles.sqlite3")
+        for name in "cabdc":
+            db.insert_tile_pool(name, "owner", TilePool(frozenset([Tile(name)])))
+
+        pages = [db.get_tile_pools(size=2, page=page, sort=SortMethod.NAME) for page in (1, 2, 3)]
+        assert [[pool["name"] for pool in page or ()] for page in pages] == [
+            ["a", "b"],
+            ["c", "c"],
+            ["d"],
+        ]
+        assert (pools := db.get_tile_pools(size=2, sort=SortMethod.NAME, sort_asc=False))
+        assert [pool["name"] for pool in pools] == ["d", "c"]
+        assert all(pool["tiles"].tiles == {Tile(pool["name"])} for pool in pools)
+
+        other = SQLiteTilePoolDB(tmp_path / "tiles.sqlite3")
+        with other._connect() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        assert not other.update_tiles("missing", ["a"])
+
+    def test_consistent_reads(self, tmp_path, monkeypatch):
+        path = tmp_path / "tiles.sqlite3"
+        db = SQLiteTilePoolDB(path)
+        ids = [db.insert_tile_pool(n, "owner", TilePool(frozenset([Tile(n)]))) for n in "012"]
+        connect = sqlite3.connect
+
+        class Interrupted(sqlite3.Connection):
+            def execute(self, sql, *args):
+                cursor = super().execute(sql, *args)
+                # another process deletes the first pool between reading pools and their tiles
+                if sql.startswith("SELECT id, owner"):
+                    with contextlib.closing(connect(path)) as conn, conn:
+                        conn.execute("PRAGMA foreign_keys = ON")
+                        conn.execute("DELETE FROM pools WHERE id = ?", (ids[0],))
+                return cursor
+
+        monkeypatch.setattr(
+            sqlite3, "connect", lambda *args, **kw: connect(*args, **kw, factory=Interrupted)
+        )
+        assert (pools := db.get_tile_pools(size=1, page=1)) is not None
+        assert [pool["tiles"].tiles for pool in pools] == [{Tile("0")}]
+
+
+class TestCachingTilePoolDB:
+    def test_lru(self):
+        db = CachingTilePoolDB(MemoryTilePoolDB(), max_pools=2, ttl=None)
+        pools = [TilePool(frozenset([Tile(f"{i}")])) for i in range(3)]
+        ids = [db.insert_tile_pool("NAME", "owner", pool) for pool in pools]
+        assert all(ids)
+
+        for id_ in ids[0], ids[1], ids[0], ids[2], ids[1]:
+            assert (result := db.get_tile_pool(id_)) is not None and result["id"] == id_
+        assert db.get_tile_pool("missing") is None
+        # the second pool was the least recently used when the third was read
+        assert db.stats() == {"hits": 1, "misses": 5, "evictions": 2, "expirations": 0, "size": 2}
+
+    def test_expiry(self, monkeypatch):
+        db = CachingTilePoolDB(MemoryTilePoolDB(), ttl=10)
+        id_ = db.insert_tile_pool("NAME", "owner", TilePool(frozenset([Tile("a")])))
+        assert id_ is not None
+
+        now = 100.0
+        monkeypatch.setattr("bingomaker.data.cache.time.monotonic", lambda: now)
+        db.get_tile_pool(id_)
+        now = 109.0
+        db.get_tile_pool(id_)
+        now = 110.0
+        db.get_tile_pool(id_)
+        assert db.stats() == {"hits": 1, "misses": 2, "evictions": 0, "expirations": 1, "size": 1}
+
+    def test_invalidation(self):
+        db = CachingTilePoolDB(MemoryTilePoolDB())
+        first = db.insert_tile_pool("first", "owner", TilePool(frozenset([Tile("a")])))
+        second = db.insert_tile_pool("second", "other", TilePool(frozenset([Tile("b")])))
+        assert first is not None and second is not None
+        db.get_tile_pool(first)
+        db.get_tile_pool(second)
+
+        assert db.update_tiles(first, ["a"], [Tile("c")])
+        assert (result := db.get_tile_pool(first)) is not None
+        assert result["tiles"].tiles == {Tile("c")}
+        assert db.stats()["misses"] == 3
+
+        assert db.delete_tile_pool_by_owner("owner")
+        assert db.get_tile_pool(first) is None
+        assert db.get_tile_pool(second) is not None
+        assert db.delete_tile_pool(second)
+        assert db.get_tile_pool(second) is None
+        assert db.stats() == {"hits": 1, "misses": 5, "evictions": 0, "expirations": 0, "size": 0}
+
+
+@pytest.mark.localstack
+class TestDynamoTilePoolDB:
+    def test_convert_tile_list(self):
+        db = DynamoTilePoolDBTest()
+        tiles = [{"content": f"{i}", "tags": [], "imageUrl": None} for i in range(3)]
+        tiles.append({"content": "url", "type": "image", "tags": ["image"]})
+        db.client.put_item(
+            TableName=db.table_name,
+            Item=db._dict_to_dynamodb(
+                {
+                    "id": "legacy",
+                    "owner": "owner",
+                    "name": "NAME",
+                    "tiles": tiles,
+                    "createdAt": "2024-11-08T01:02:03",
+                    "listing": "pool",
+                    "freeTile": {"content": "Free", "tags": [], "imageUrl": None},
+                }
+            ),
+        )
+
+        assert db.update_tiles("legacy", ["0"], [Tile("4")])
+        assert (result := db.get_tile_pool("legacy"))
+        assert result["tiles"].tiles == {
+            Tile("1"),
+            Tile("2"),
+            Tile("4"),
+            Tile("url", frozenset(["image"]), "url"),
+        }
+        item = db.client.get_item(TableName=db.table_name, Key={"id": {"S": "legacy"}})["Item"]
+        assert "tiles" not in item and item["revision"] == {"N": "1"}
+        assert not db.update_tiles("missing", ["0"])
+
+    def test_migrate_listings(self):
+        db = DynamoTilePoolDBTest()
+        for id_, listing in ("unlisted", None), ("unsharded", "pool"):
+            item = {
+                "id": id_,
+                "owner": "owner",
+                "name": id_,
+                "tileMap": {},
+                "createdAt": "2024-11-08T01:02:03",
+                "freeTile": {"content": "Free", "tags": [], "imageUrl": None},
+            }
+            if listing is not None:
+                item["listing"] = listing
+            db.client.put_item(TableName=db.table_name, Item=db._dict_to_dynamodb(item))
+        pool_id = db.insert_tile_pool("x" * 2000, "owner", TilePool(frozenset(), Tile("Free")))
+        assert pool_id is not None
+        pools = db.get_tile_pools(10, sort=SortMethod.NAME) or ()
+        assert [pool["id"] for pool in pools] == [pool_id]
+
+        assert db.migrate_listings() == 2
+        assert db.migrate_listings() == 0
+        pools = db.get_tile_pools(10, sort=SortMethod.NAME) or ()
+        assert [pool["id"] for pool in pools] == ["unlisted", "unsharded", pool_id]
+
+    def test_chunked_pool(self):
+        db = DynamoTilePoolDBTest()
+        tiles = frozenset(
+            Tile(f"{i:05} " + "x" * 100, frozenset([f"{i % 7}"])) for i in range(5000)
+        )
+        pool_id = db.insert_tile_pool("NAME", "owner", TilePool(tiles, Tile("Free")))
+        assert pool_id is not None
+
+        item = db.client.get_item(TableName=db.table_name, Key={"id": {"S": pool_id}})["Item"]
+        assert "tileMap" not in item and int(item["chunks"]["N"]) > 1
+        assert (result := db.get_tile_pool(pool_id)) and result["tiles"].tiles == tiles
+        assert db.get_tile_pool(f"{pool_id}#0") is None
+
+        removed = sorted(tiles, key=lambda tile: tile.text)[:10]
+        assert db.update_tiles(pool_id, [tile.text for tile in removed], [Tile("new")])
+        # a fresh instance has to find out the pool is chunked
+        other = DynamoTilePoolDB.__new__(DynamoTilePoolDB)
+        other.client, other.table_name = db.client, db.table_name
+        assert other.update_tiles(pool_id, insertions=[Tile("newer")])
+        assert (pools := other.get_tile_pools(size=10)) and len(pools) == 1
+        assert pools[0]["tiles"].tiles == tiles - set(removed) | {Tile("new"), Tile("newer")}
+
+        assert db.delete_tile_pool(pool_id)
+        assert "Item" not in db.client.get_item(
+            TableName=db.table_name, Key={"id": {"S": f"{pool_id}#0"}}
+        )
+
+    def test_grow_inline_pool(self):
+        db = DynamoTilePoolDBTest()
+        tiles = [Tile(f"{i:05} " + "x" * 100) for i in range(2000)]
+        pool = TilePool(frozenset(tiles[:500]), Tile("Free"))
+        pool_id = db.insert_tile_pool("NAME", "owner", pool)
+        assert pool_id is not None
+        key = {"id": {"S": pool_id}}
+        assert "tileMap" in db.client.get_item(TableName=db.table_name, Key=key)["Item"]
+
+        # growing the tile map past the item size limit splits the pool on the way
+        assert db.update_tiles(pool_id, [tiles[0].text], tiles[500:])
+        item = db.client.get_item(TableName=db.table_name, Key=key)["Item"]
+        assert "tileMap" not in item and "tileBytes" not in item
+        assert int(item["chunks"]["N"]) > 1 and item["chunkSet"]["S"]
+        assert (result := db.get_tile_pool(pool_id))
+        assert result["tiles"].tiles == frozenset(tiles[1:])
+
+        assert db.delete_tile_pool(pool_id)
+        assert not db.client.scan(TableName=db.table_name)["Items"]
+
+    def test_grow_chunked_pool(self):
+        db = DynamoTilePoolDBTest()
+        tiles = [Tile(f"{i:05} " + "x" * 100) for i in range(4000)]
+        pool = TilePool(frozenset(tiles[:1200]), Tile("Free"))
+        pool_id = db.insert_tile_pool("NAME", "owner", pool)
+        assert pool_id is not None
+        key = {"id": {"S": pool_id}}
+        item = db.client.get_item(TableName=db.table_name, Key=key)["Item"]
+        chunks = int(item["chunks"]["N"])
+        assert chunks > 1 and "chunkSet" not in item
+
+        # a fresh instance does not know the layout, and the chunks grow past the limit
+        other = DynamoTilePoolDB.__new__(DynamoTilePoolDB)
+        other.client, other.table_name = db.client, db.table_name
+        assert other.update_tiles(pool_id, insertions=tiles[1200:])
+        stale, item = item, db.client.get_item(TableName=db.table_name, Key=key)["Item"]
+        assert int(item["chunks"]["N"]) >= 2 * chunks
+        assert (result := db.get_tile_pool(pool_id)) and result["tiles"].tiles == set(tiles)
+        # an item read before the split is read again
+        assert db._load([stale])[0]["tiles"].tiles == set(tiles)
+        ids = {item["id"]["S"] for item in db.client.scan(TableName=db.table_name)["Items"]}
+        assert len(ids) == int(item["chunks"]["N"]) + 1
+        assert f"{pool_id}#0" not in ids
+
+        # the layout known to the first instance is out of date
+        assert db.update_tiles(pool_id, [tiles[0].text], [Tile("new")])
+        assert (result := other.get_tile_pool(pool_id))
+        assert result["tiles"].tiles == set(tiles[1:]) | {Tile("new")}
+        assert db.delete_tile_pool(pool_id)
+        assert not db.client.scan(TableName=db.table_name)["Items"]
+
+    def test_finish_split(self):
+        db = DynamoTilePoolDBTest()
+        tiles = frozenset(Tile(f"{i:05} " + "x" * 100) for i in range(1200))
+        pool_id = db.insert_tile_pool("NAME", "owner", TilePool(tiles, Tile("Free")))
+        assert pool_id is not None
+
+        # a split which sealed a chunk and then stopped
+        db.client.update_item(
+            TableName=db.table_name,
+            Key={"id": {"S": f"{pool_id}#0"}},
+            UpdateExpression="SET sealed = :sealed",
+            ExpressionAttributeValues={":sealed": {"BOOL": True}},
+        )
+        inserted = [Tile(f"new {i}") for i in range(50)]
+        assert db.update_tiles(pool_id, insertions=inserted)
+        item = db.client.get_item(TableName=db.table_name, Key={"id": {"S": pool_id}})["Item"]
+        assert "chunkSet" in item
+        assert (result := db.get_tile_pool(pool_id))
+        assert result["tiles"].tiles == tiles | set(inserted)
+
+    def test_multibyte_pool(self):
+        db = DynamoTilePoolDBTest()
+        # three bytes a character, which would not fit in one item
+        tiles = frozenset(Tile(f"{i:04}" + "漢" * 100) for i in range(1000))
+        pool_id = db.insert_tile_pool("NAME", "owner", TilePool(tiles, Tile("Free")))
+        assert pool_id is not None
+        item = db.client.get_item(TableName=db.table_name, Key={"id": {"S": pool_id}})["Item"]
+        assert int(item["chunks"]["N"]) > 1
+        assert (result := db.get_tile_pool(pool_id)) and result["tiles"].tiles == tiles
+
+        too_large = TilePool(frozenset([Tile("漢" * 50_000)]), Tile("Free"))
+        assert db.insert_tile_pool("NAME", "owner", too_large) is None
+
+    def test_delete_by_owner_batched(self, monkeypatch):
+        db = DynamoTilePoolDBTest()
+        chunked = frozenset(Tile(f"{i:05} " + "x" * 100) for i in range(3000))
+        pool = TilePool(frozenset([Tile("0")]), Tile(""))
+        # more pools per owner than fit in a batch, in every listing shard
+        pool_ids = [db.insert_tile_pool("NAME", f"owner {i % 2}", pool) for i in range(240)]
+        chunked_ids = [
+            db.insert_tile_pool("NAME", "owner 0", TilePool(chunked, Tile(""))) for _ in range(3)
+        ]
+
+        # small query pages, so the owner index is paginated
+        query, batches = db.client.query, []
+        monkeypatch.setattr(db.client, "query", lambda **kwargs: query(**kwargs, Limit=10))
+        batch_write_item = db.client.batch_write_item
+
+        def record_batch(**kwargs):
+            batches.append(len(kwargs["RequestItems"][db.table_name]))
+            return batch_write_item(**kwargs)
+
+        monkeypatch.setattr(db.client, "batch_write_item", record_batch)
+
+        assert db.delete_tile_pool_by_owner("owner 0")
+        assert sum(batches) > 123 and max(batches) <= 25
+        for chunked_id in chunked_ids:
+            assert db.get_tile_pool(str(chunked_id)) is None
+            assert "Item" not in db.client.get_item(
+                TableName=db.table_name, Key={"id": {"S": f"{chunked_id}#0"}}
+            )
+        monkeypatch.undo()
+        assert db.get_tile_pools() is None
+        remaining = db.get_tile_pools(len(pool_ids)) or []
+        assert sorted(pool["id"] for pool in remaining) == sorted(pool_ids[1::2])
+
+
+class TestDynamoCodec:
+    def test_generic_values(self):
+        db = DynamoTilePoolDB()
+        data = {"b": True, "n": 2, "f": 1e-05, "l": [None, "s", {"m": False}]}
+        assert db._dict_to_dynamodb(data)["b"] == {"BOOL": True}
+        assert db._dynamodb_to_dict(db._dict_to_dynamodb(data)) == data
+
+    def test_tile_codec(self):
+        db = DynamoTilePoolDB()
+        tiles = [
+            Tile(f"{i}", frozenset([f"{i % 10}", "all"]), f"url {i}" if i % 3 else None, i % 4 + 1)
+            for i in range(1_000)
+        ]
+
+        # the tile codec must match the generic conversion pools used before it
+        encoded = {"M": {tile.text: _tile_to_dynamodb(tile) for tile in tiles}}
+        generic = {
+            tile.text: {
+                "content": tile.text,
+                "tags": list(tile.tags),
+                "imageUrl": tile.image_url,
+                "weight": tile.weight,
+            }
+            for tile in tiles
+        }
+        assert encoded == db._dict_to_dynamodb({"tileMap": generic})["tileMap"]
+        assert frozenset(map(_dynamodb_to_tile, encoded["M"].values())) == frozenset(tiles)
@@ -1,6 +1,30 @@
+import copy
+import itertools
+import math
+import os
+import pickle
+import random
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
 from examples import example_game
 
-from bingomaker.game.game import Tile, TilePool
+from bingomaker.game.cardid import (
+    card_id,
+    decode_card_id,
+    distinct_boards,
+    rank_selection,
+    unrank_selection,
+)
+from bingomaker.game.cardset import generate_card_set
+from bingomaker.game.columnar import ColumnarTilePool
+from bingomaker.game.game import Board, NoMatchingTile, Tile, TilePool, generate_boards
+from bingomaker.game.rng import CardRandom
+from bingomaker.game.session import GameSession, cell_lines, line_masks
+from bingomaker.game.simulation import PERCENTILES, percentiles, simulate
 
 
 def test_consistent_get_tile():
@@ -28,3 +52,322 @@ def test_set_free_tile():
     middle_tile = game.board[3][3]
     assert middle_tile.text == "Free"
     assert middle_tile.image_url == "free_url"
+
+
+def test_board_tiles_unique():
+    for size in range(1, 7):
+        game = example_game(size, seed=size)
+        tiles = [tile for row in game.board for tile in row]
+        assert len(tiles) == size * size
+        assert len(set(tiles)) == len(tiles)
+
+
+def test_board_tiles_same_text():
+    # cells are distinct tiles, tiles only differing in tags are not merged by their text
+    tiles = frozenset([Tile("a", frozenset(["x"])), Tile("a"), Tile("b"), Tile("c")])
+    board = Board(TilePool(tiles), size=2, free_square=False)
+    assert len(set(board.indices)) == 4
+    assert sorted(tile.text for row in board.board for tile in row) == ["a", "a", "b", "c"]
+
+
+def test_board_consistent_seed():
+    assert example_game(5, seed=7).board == example_game(5, seed=7).board
+
+
+def test_sample_excluded_tags():
+    tiles = frozenset(Tile(f"{x}", frozenset([f"tag_{x % 4}"])) for x in range(100))
+    pool = TilePool(tiles)
+
+    for k in (1, 10, 50, 75):
+        sampled = pool.sample(k, exclude_tags=["tag_0"], seed=k)
+        assert len(set(sampled)) == k
+        assert all("tag_0" not in tile.tags for tile in sampled)
+
+    with pytest.raises(NoMatchingTile):
+        pool.sample(51, exclude_tags=["tag_0", "tag_1"])
+
+
+def test_board_too_few_tiles():
+    pool = TilePool(frozenset(Tile(f"{x}") for x in range(24)), Tile("Free"))
+    Board(pool, size=5, free_square=True)
+
+    with pytest.raises(NoMatchingTile):
+        Board(pool, size=5, free_square=False)
+
+
+def test_filter_by_tags():
+    tiles = frozenset(Tile(f"{x}", frozenset([f"tag_{x % 3}", f"{x}"])) for x in range(30))
+    pool = TilePool(tiles)
+
+    remaining = list(pool._filter_by_tags(["tag_1", "0", "not a tag"]))
+    assert len(remaining) == 19
+    assert all(not tile.tags & {"tag_1", "0"} for tile in remaining)
+    assert all(isinstance(tile.tags, frozenset) for tile in remaining)
+
+
+def test_tile_equality():
+    tile = Tile("text", frozenset(["a", "b"]), "url")
+    same = Tile("text", frozenset(["b", "a"]), "url")
+
+    assert tile == same and hash(tile) == hash(same)
+    assert tile.tags is same.tags
+    assert tile != Tile("text", frozenset(["a"]), "url")
+    assert tile != Tile("text", frozenset(["a", "b"]))
+    assert tile != "text"
+    assert copy.deepcopy(tile) == tile
+
+
+def test_tile_pickle():
+    tile = Tile("text", frozenset(["a", "b"]), "url", 2)
+    # a pickle from another process hashes strings differently
+    script = (
+        "import pickle, sys; from bingomaker.game.game import Tile; "
+        "sys.stdout.buffer.write(pickle.dumps(Tile('text', frozenset(['a', 'b']), 'url', 2)))"
+    )
+    pickled = subprocess.run(
+        [sys.executable, "-c", script],
+        check=True,
+        capture_output=True,
+        cwd=Path(__file__).parent.parent,
+        env=os.environ | {"PYTHONHASHSEED": "1"},
+    ).stdout
+
+    assert pickle.loads(pickled) in {tile}
+    assert hash(pickle.loads(pickle.dumps(tile))) == hash(tile)
+
+
+def test_columnar_pool():
+    tiles = frozenset(
+        Tile(f"{x}", frozenset([f"tag_{x % 3}", f"{x}"]), f"url {x}" if x % 2 else None)
+        for x in range(50)
+    )
+    pool = TilePool(tiles, Tile("Free"))
+    columnar = ColumnarTilePool.from_pool(pool)
+
+    assert len(columnar) == len(pool)
+    assert columnar.tiles == pool.tiles
+    assert list(columnar) == list(pool)
+    assert all(tile in columnar for tile in tiles)
+    assert Tile("Free") in columnar
+    assert Tile("0") not in columnar and Tile("not a tile") not in columnar
+
+    assert columnar.sample(10, ["tag_0"], seed=3) == pool.sample(10, ["tag_0"], seed=3)
+    assert Board(columnar, seed=5).board == Board(pool, seed=5).board
+    assert (columnar - pool).tiles == frozenset()
+
+    # combined pools stay columnar, and the tiles are shared while they are in use
+    combined = columnar + TilePool(frozenset([Tile("new")]))
+    assert isinstance(combined, ColumnarTilePool) and combined.free == Tile("Free")
+    assert combined.tiles == tiles | {Tile("new")}
+    assert isinstance(columnar - pool, ColumnarTilePool)
+    assert columnar.tiles is columnar.tiles
+    tiles_in_use = columnar.tiles
+    assert list(pickle.loads(pickle.dumps(columnar))) == list(columnar) and tiles_in_use
+
+
+def test_weighted_sample():
+    tiles = [Tile(f"{x}", frozenset([f"tag_{x % 2}"]), weight=1 + x) for x in range(10)]
+    pool = TilePool(frozenset(tiles), Tile("Free"))
+    assert pool.version != TilePool(frozenset(Tile(f"{x}") for x in range(10))).version
+    assert tiles[0] != Tile("0", frozenset(["tag_0"]), weight=2)
+    with pytest.raises(ValueError):
+        Tile("0", weight=0)
+
+    # alias table probabilities and aliases reproduce the weights
+    prob, alias = pool._alias
+    mass = [p / len(pool) for p in prob]
+    for i, p in enumerate(prob):
+        mass[alias[i]] += (1 - p) / len(pool)
+    assert all(math.isclose(m, tile.weight / 55) for m, tile in zip(mass, pool, strict=True))
+
+    rng = CardRandom(0)
+    counts = Counter(i for _ in range(20_000) for i in pool.sample_indices(1, rng=rng))
+    assert counts[pool.index(tiles[9])] > 4 * counts[pool.index(tiles[0])]
+
+    # drawing every tile goes through the exhaustive fallback
+    for _ in range(20):
+        drawn = pool.sample_indices(5, ["tag_1"], rng)
+        assert sorted(pool[i].text for i in drawn) == ["0", "2", "4", "6", "8"]
+
+    columnar = ColumnarTilePool.from_pool(pool)
+    assert list(columnar) == list(pool)
+    assert Board(columnar, 3, seed=5).board == Board(pool, 3, seed=5).board
+
+
+def test_card_random():
+    assert CardRandom(1).getrandbits(64) == CardRandom(1).getrandbits(64)
+    assert CardRandom(1).getrandbits(64) != CardRandom(2).getrandbits(64)
+    assert CardRandom(1).spawn(0).random() != CardRandom(1).spawn(1).random()
+
+    rng = CardRandom(5)
+    state = rng.getstate()
+    first = [rng.random() for _ in range(10)]
+    rng.setstate(state)
+    assert [rng.random() for _ in range(10)] == first
+    assert all(0.0 <= x < 1.0 for x in first)
+    assert rng.getrandbits(200) < 1 << 200
+
+    # seeds wrap to 64 bits
+    assert CardRandom(-1).getrandbits(64) == CardRandom((1 << 64) - 1).getrandbits(64)
+
+
+def test_board_compat():
+    tiles = frozenset(Tile(f"{x}") for x in range(100))
+    pool = TilePool(tiles, Tile("Free"))
+
+    # pinned, so compat cards stay the same across releases
+    board = Board(pool, seed=10, compat=True)
+    texts = [tile.text for row in board.board for tile in row]
+    assert " ".join(texts) == (
+        "75 12 58 64 99 1 32 62 65 40 84 27 Free 98 69 91 46 17 37 50 13 57 24 79 5"
+    )
+    legacy = pool.sample_indices(24, rng=random.Random(10))
+    legacy.insert(12, Board.FREE)
+    assert board.indices == legacy
+    assert board.indices != Board(pool, seed=10).indices
+
+    boards = {tuple(Board(pool, seed=seed).indices) for seed in range(0, 1 << 64, 1 << 58)}
+    assert len(boards) == 64
+
+
+def test_rank_selection():
+    for n, k in ((5, 0), (5, 3), (6, 6)):
+        ranks = [rank_selection(n, selection) for selection in itertools.permutations(range(n), k)]
+        assert sorted(ranks) == list(range(math.perm(n, k)))
+        for rank in ranks:
+            assert rank_selection(n, unrank_selection(n, k, rank)) == rank
+
+    with pytest.raises(ValueError):
+        rank_selection(5, [1, 2, 1])
+    with pytest.raises(ValueError):
+        rank_selection(5, [5])
+    with pytest.raises(ValueError):
+        unrank_selection(5, 3, math.perm(5, 3))
+
+
+def test_card_id():
+    tiles = frozenset(Tile(f"{x}", frozenset([f"{x}"])) for x in range(1000))
+    pool = TilePool(tiles, Tile("Free"))
+
+    for free_square in (True, False):
+        for size in (1, 4, 5):
+            board = Board(pool, size=size, free_square=free_square, seed=size)
+            id_ = card_id(pool, board)
+            assert id_.startswith(pool.version)
+            decoded = decode_card_id(pool, id_)
+            assert decoded.board == board.board
+            assert decoded.indices == board.indices
+
+    other = pool + TilePool(frozenset([Tile("new")]))
+    with pytest.raises(ValueError):
+        decode_card_id(other, card_id(pool, Board(pool)))
+    with pytest.raises(ValueError):
+        decode_card_id(pool, f"{pool.version}-not/base62")
+
+
+def test_distinct_boards():
+    pool = TilePool(frozenset(Tile(f"{x}") for x in range(6)), Tile("Free"))
+
+    boards = list(distinct_boards(pool, 120, size=2, free_square=False, seed=3))
+    assert len({tuple(board.indices) for board in boards}) == 120
+    assert all(decode_card_id(pool, board.id).indices == board.indices for board in boards)
+
+    with pytest.raises(NoMatchingTile):
+        list(distinct_boards(pool, 361, size=2, free_square=False))
+
+
+def test_card_set_unique():
+    pool = TilePool(frozenset(Tile(f"{x}") for x in range(6)))
+
+    boards = list(generate_card_set(pool, 300, size=2, free_square=False, seed=1))
+    assert len({tuple(board.indices) for board in boards}) == 300
+    assert all(Board(pool, 2, False, board.seed).indices == board.indices for board in boards)
+
+
+def test_card_set_overlap():
+    pool = TilePool(frozenset(Tile(f"{x}") for x in range(12)))
+
+    boards = list(generate_card_set(pool, 20, size=2, free_square=False, max_overlap=2, seed=1))
+    for a, b in itertools.combinations(boards, 2):
+        assert len(set(a.indices) & set(b.indices)) <= 2
+
+    with pytest.raises(NoMatchingTile):
+        list(generate_card_set(pool, 1000, size=2, free_square=False, max_overlap=1))
+    with pytest.raises(ValueError):
+        next(generate_card_set(pool, 1, size=5, free_square=False, max_overlap=10))
+    with pytest.raises(ValueError):
+        next(generate_card_set(pool, 2, size=2, free_square=False, max_overlap=-1))
+    # the filters would take hundreds of megabytes
+    with pytest.raises(ValueError):
+        next(generate_card_set(pool, 100_000, size=5, max_overlap=2))
+
+
+def test_line_masks():
+    assert line_masks(3) == (
+        0b000000111,
+        0b000111000,
+        0b111000000,
+        0b001001001,
+        0b010010010,
+        0b100100100,
+        0b100010001,
+        0b001010100,
+    )
+    assert cell_lines(3)[4] == (0b000111000, 0b010010010, 0b100010001, 0b001010100)
+    assert cell_lines(3)[1] == (0b000000111, 0b010010010)
+
+
+def test_game_session():
+    pool = TilePool(frozenset(Tile(f"{x}") for x in range(30)), Tile("Free"))
+    boards = list(generate_boards(pool, 50, size=3, seed=1))
+    session = GameSession(pool, seed=2)
+    ids = [session.register(board) for board in boards]
+    assert len(set(ids)) == 50
+
+    # calling the middle row of the first board wins it through the free square
+    first = boards[0]
+    assert session.call(first.board[1][0]) == []
+    assert not session.verify(ids[0])
+    assert ids[0] in session.call(first.indices[5])
+    assert session.verify(ids[0])
+    assert session.winners[ids[0]] == 2
+
+    with pytest.raises(ValueError):
+        session.call(first.board[1][0])
+
+    while len(session.calls) < len(pool):
+        session.draw()
+    with pytest.raises(IndexError):
+        session.draw()
+    assert len(session.winners) == 50
+    assert all(session.verify(id_) for id_ in ids)
+
+    late = Board(pool, size=3, seed=100)
+    assert session.winners.get(session.register(late, "late")) == len(pool)
+
+
+def test_simulation():
+    # a board holding the whole pool always wins on the last call of its first line
+    report = simulate(9, board_size=3, free_square=False, boards=1, games=50, seed=1, workers=1)
+    assert report["games"] == 50
+    assert all(3 <= calls <= 7 for calls in report["calls"].values())
+    assert report["winners"] == {q: 1 for q in PERCENTILES}
+
+    report = simulate(30, boards=20, games=200, seed=2, workers=2)
+    assert report == simulate(30, boards=20, games=200, seed=2, workers=1)
+    assert 4 <= report["calls"][1] <= report["calls"][50] <= report["calls"][99] <= 30
+
+    with pytest.raises(ValueError):
+        simulate(10, board_size=5)
+
+
+def test_percentiles():
+    histogram = Counter({1: 50, 2: 40, 3: 9, 10: 1})
+    assert percentiles(histogram, (1, 50, 51, 90, 99, 100)) == {
+        1: 1,
+        50: 1,
+        51: 2,
+        90: 2,
+        99: 3,
+        100: 10,
+    }
@@ -3,7 +3,11 @@ import io
 import pytest
 from PIL import Image
 
-from bingomaker.image_process import resize_gif, resize_image
+from bingomaker.game.game import Tile, TilePool, generate_boards
+from bingomaker.image_process import SheetLayout, render_cards, resize_gif, resize_image
+from bingomaker.image_process.render import fetch_image
+from bingomaker.images.local import LocalImageManager
+from bingomaker.images.memory import MemoryReferenceCounts
 
 
 @pytest.fixture
@@ -58,3 +62,46 @@ def test_resize_gif(gif: io.BytesIO):
     img = Image.open(resize_gif(gif))
     assert img.size == (128, 128)
     assert img.format == "GIF"
+
+
+def test_render_cards(tmp_path):
+    images = LocalImageManager(tmp_path, MemoryReferenceCounts())
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color="red").save(buffer, "PNG")
+    buffer.seek(0)
+    image_id = images.add_image(buffer, {"mimetype": "image/png", "size": len(buffer.getvalue())})
+
+    tiles = frozenset(Tile(f"Tile {i}") for i in range(7)) | {Tile("red", image_url=image_id)}
+    pool = TilePool(tiles, Tile("Free"))
+    layout = SheetLayout(page_size=(4, 4), columns=1, rows=1, margin=0.25, dpi=50)
+
+    pages = render_cards(pool, generate_boards(pool, 3, size=3), tmp_path / "png", layout, images)
+    assert pages == 3
+    for path in sorted((tmp_path / "png").iterdir()):
+        page = Image.open(path)
+        assert page.size == (200, 200)
+        assert (255, 0, 0) in {color for _, color in page.convert("RGB").getcolors(1 << 16)}
+
+    pdf = tmp_path / "cards.pdf"
+    assert render_cards(pool, generate_boards(pool, 5, size=3), pdf, layout, workers=2) == 5
+    data = pdf.read_bytes()
+    assert data.startswith(b"%PDF") and data.count(b"/Type /Page ") == 5
+
+
+def test_fetch_image_schemes(tmp_path):
+    path = tmp_path / "secret.png"
+    Image.new("RGB", (8, 8), color="red").save(path, "PNG")
+
+    # tile urls could otherwise read any file the server can
+    with pytest.raises(ValueError):
+        fetch_image(path.as_uri())
+    with pytest.raises(ValueError):
+        fetch_image(f"ftp://localhost/{path}")
+    assert fetch_image(path.as_uri(), managed=True).size == (8, 8)
+
+    tiles = frozenset([Tile("secret", image_url=path.as_uri())])
+    pool = TilePool(tiles)
+    layout = SheetLayout(page_size=(2, 2), columns=1, rows=1, margin=0.25, dpi=50)
+    render_cards(pool, generate_boards(pool, 1, size=1, free_square=False), tmp_path, layout)
+    page = Image.open(tmp_path / "page-00001.png").convert("RGB")
+    assert (255, 0, 0) not in {color for _, color in page.getcolors(1 << 16)}
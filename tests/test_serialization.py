@@ -1,8 +1,16 @@
 import json
 
+import pytest
 from examples import example_game
 
-from bingomaker.data.serialization import BoardEncoder
+from bingomaker.data.serialization import (
+    BoardEncoder,
+    board_to_bytes,
+    board_to_compact,
+    boards_from_bytes,
+    stream_end,
+)
+from bingomaker.game.game import Board, Tile, TilePool
 
 
 def test_serialize_board():
@@ -26,3 +34,41 @@ def test_serialize_board():
 
     for i in range(1, 7):
         test_board(i)
+
+
+def test_compact_board():
+    pool = TilePool(frozenset(Tile(f"{i}") for i in range(100)), Tile("Free"))
+    boards = [Board(pool, size=size, seed=size) for size in (1, 4, 5)]
+
+    compact = board_to_compact(pool, boards[2])
+    assert compact["version"] == pool.version
+    assert [pool[i] if i != Board.FREE else pool.free for i in compact["indices"]] == [
+        tile for row in boards[2].board for tile in row
+    ]
+
+    data = b"".join(board_to_bytes(pool, board) for board in boards)
+    assert len(data) == sum(7 + 2 * board.size**2 for board in boards)
+    decoded = list(boards_from_bytes(pool, data))
+    assert [board.board for board in decoded] == [board.board for board in boards]
+
+    # wide indices for large pools
+    large = TilePool(frozenset(Tile(f"{i}") for i in range(70_000)), Tile("Free"))
+    board = Board(large, seed=1)
+    [decoded] = boards_from_bytes(large, board_to_bytes(large, board))
+    assert decoded.indices == board.indices
+
+    with pytest.raises(ValueError):
+        list(boards_from_bytes(large, data))
+    with pytest.raises(ValueError):
+        list(boards_from_bytes(pool, data[:-1]))
+
+    # streams end with a record counting their boards
+    stream = data + stream_end(len(boards))
+    assert len(list(boards_from_bytes(pool, stream, stream=True))) == len(boards)
+    assert len(list(boards_from_bytes(pool, stream))) == len(boards)
+    with pytest.raises(ValueError):
+        list(boards_from_bytes(pool, data, stream=True))
+    with pytest.raises(ValueError):
+        list(boards_from_bytes(pool, data + stream_end(len(boards) + 1), stream=True))
+    with pytest.raises(ValueError):
+        list(boards_from_bytes(pool, stream[:-1], stream=True))